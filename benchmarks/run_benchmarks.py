@@ -0,0 +1,249 @@
+"""
+Benchmarks of the hot paths of datalite, run against temporary
+    databases, at several table sizes and row widths. Results
+    are written as JSON, and can be compared to the results of
+    a previous run to catch regressions.
+
+    python benchmarks/run_benchmarks.py --sizes 1000 100000 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+from argparse import ArgumentParser
+from dataclasses import field, make_dataclass
+from datetime import datetime, timezone
+from itertools import cycle
+from os.path import abspath, dirname, join
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import platform
+import random
+import sqlite3 as sql
+import sys
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))  # Benchmark the working tree, not an installed copy.
+
+from datalite import datalite  # noqa: E402
+from datalite.connections import close_all  # noqa: E402
+from datalite.fetch import fetch_all, fetch_from, fetch_range, fetch_where  # noqa: E402
+from datalite.mass_actions import create_many  # noqa: E402
+from datalite.migrations import basic_migrate  # noqa: E402
+
+"""
+Row widths benchmarked, as the number of fields of
+    each type in the benchmarked class.
+"""
+WIDTHS: Dict[str, int] = {'narrow': 1, 'wide': 6}
+FIELD_TYPES: Tuple[type, ...] = (int, float, str)
+
+
+def _fields(width: int, extra: Tuple[Tuple[str, type], ...] = ()) -> List[Tuple[str, type, Any]]:
+    """
+    Get the fields of a benchmarked class.
+
+    :param width: Number of fields of each type.
+    :param extra: Additional fields, with a default value.
+    :return: Fields, as accepted by make_dataclass.
+    """
+    fields = [(f"{type_.__name__}_{index}", type_) for index in range(width) for type_ in FIELD_TYPES]
+    return fields + [(name, type_, field(default=type_())) for name, type_ in extra]
+
+
+def _make_class(db_path: str, width: int, extra: Tuple[Tuple[str, type], ...] = ()) -> type:
+    """
+    Create a datalite class bound to a benchmark database.
+
+    :param db_path: Path of the database.
+    :param width: Number of fields of each type.
+    :param extra: Additional fields, with a default value.
+    :return: The datalite class.
+    """
+    return datalite(db_path)(make_dataclass('Record', _fields(width, extra)))
+
+
+def _make_objects(class_: type, width: int, count: int, seed: int) -> Iterator[Any]:
+    """
+    Generate objects of a benchmarked class, with values
+    repeating every 100 objects.
+
+    :param class_: The benchmarked class.
+    :param width: Number of fields of each type.
+    :param count: Number of objects.
+    :param seed: Value the objects start from.
+    :return: A generator of objects.
+    """
+    for index in range(seed, seed + count):
+        value = index % 100
+        yield class_(*(type_(value) if type_ is not str else f"value {value}"
+                       for _ in range(width) for type_ in FIELD_TYPES))
+
+
+def _time(function: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> List[float]:
+    """
+    Time a function.
+
+    :param function: The function to time.
+    :param repeat: Number of times the function is timed.
+    :param setup: If given, a function called before each
+        timing, outside of it.
+    :return: Durations of the calls, in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        function()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+def _benchmark_size(directory: str, rows: int, width_name: str, operations: int,
+                    repeat: int) -> Iterator[Dict[str, Any]]:
+    """
+    Run the benchmarks on a table of the given size and width.
+
+    :param directory: Directory of the temporary databases.
+    :param rows: Number of records in the table.
+    :param width_name: Name of the row width, a key of WIDTHS.
+    :param operations: Number of operations in the benchmarks
+        of single records, such as create_entry.
+    :param repeat: Number of times each benchmark is timed.
+    :return: A generator of results.
+    """
+    width = WIDTHS[width_name]
+    db_path = join(directory, f"{width_name}_{rows}.db")
+    class_ = _make_class(db_path, width)
+    rng = random.Random(rows)
+
+    def result(name: str, count: int, durations: List[float]) -> Dict[str, Any]:
+        return {'benchmark': name, 'rows': rows, 'width': width_name, 'operations': count,
+                'best_seconds': min(durations), 'median_seconds': median(durations),
+                'operations_per_second': count / median(durations) if median(durations) else None}
+
+    def clear_table() -> None:
+        with sql.connect(db_path) as con:
+            con.execute("DELETE FROM record;")
+
+    yield result('create_many', rows,
+                 _time(lambda: create_many(_make_objects(class_, width, rows, 0)), repeat, clear_table))
+    objects = list(_make_objects(class_, width, rows, 0))
+    create_many(objects)
+    first_id = getattr(objects[0], 'obj_id')  # Ids are not reused after the table is cleared.
+    ids = [first_id + rng.randrange(rows) for _ in range(operations)]
+    new_objects: List[Any] = []
+
+    def prepare_objects() -> None:
+        new_objects[:] = _make_objects(class_, width, operations, rows)
+    yield result('create_entry', operations,
+                 _time(lambda: [obj.create_entry() for obj in new_objects], repeat, prepare_objects))
+    fetched = [fetch_from(class_, obj_id) for obj_id in ids]
+
+    def modify_objects() -> None:
+        for obj in fetched:
+            setattr(obj, 'int_0', getattr(obj, 'int_0') + 1)
+    yield result('update_entry', operations,
+                 _time(lambda: [obj.update_entry() for obj in fetched], repeat, modify_objects))
+    yield result('fetch_from', operations, _time(lambda: [fetch_from(class_, obj_id) for obj_id in ids], repeat))
+    values = [f"value {value % 100}" for value in ids[:max(1, operations // 100)]]
+    yield result('fetch_where', len(values),
+                 _time(lambda: [fetch_where(class_, 'str_0', value) for value in values], repeat))
+    yield result('fetch_all', 1, _time(lambda: fetch_all(class_), repeat))
+    pages = max(1, min(operations, rows // 100))
+    yield result('fetch_all_paginated', pages,
+                 _time(lambda: [fetch_all(class_, page, 100) for page in range(1, pages + 1)], repeat))
+    range_size = min(rows, 1000)
+    starts = [first_id + rng.randint(0, rows - range_size) for _ in range(max(1, operations // 100))]
+    yield result('fetch_range', len(starts),
+                 _time(lambda: [fetch_range(class_, range(start, start + range_size)) for start in starts], repeat))
+    # Migrations alternate between two definitions, so that each repetition changes the table.
+    definitions = cycle([_make_class(db_path, width, (('extra', int), )), _make_class(db_path, width)])
+    yield result('basic_migrate_alter', 1, _time(lambda: basic_migrate(next(definitions)), repeat))
+    basic_migrate(_make_class(db_path, width, (('extra', int), )))
+    definitions = cycle([_make_class(db_path, width, (('extra', str), )), _make_class(db_path, width, (('extra', int), ))])
+    yield result('basic_migrate_rebuild', 1, _time(lambda: basic_migrate(next(definitions)), repeat))
+    close_all(db_path)
+
+
+def run(sizes: List[int], widths: List[str], operations: int, repeat: int) -> Dict[str, Any]:
+    """
+    Run the benchmarks.
+
+    :param sizes: Numbers of records in the benchmarked tables.
+    :param widths: Names of the row widths, keys of WIDTHS.
+    :param operations: Number of operations in the benchmarks
+        of single records.
+    :param repeat: Number of times each benchmark is timed.
+    :return: The environment and the results of the benchmarks.
+    """
+    results = []
+    with TemporaryDirectory() as directory:
+        for rows in sizes:
+            for width_name in widths:
+                for result in _benchmark_size(directory, rows, width_name, operations, repeat):
+                    print(f"{result['benchmark']:>24} {rows:>9} rows {width_name:>6} "
+                          f"{result['median_seconds']:10.4f} s", file=sys.stderr)
+                    results.append(result)
+    return {'environment': {'python': platform.python_version(), 'sqlite': sql.sqlite_version,
+                            'platform': platform.platform(), 'date': datetime.now(timezone.utc).isoformat()},
+            'settings': {'sizes': sizes, 'widths': widths, 'operations': operations, 'repeat': repeat},
+            'results': results}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare results to the results of a previous run.
+
+    :param results: Results of the benchmarks.
+    :param baseline: Results of a previous run.
+    :param threshold: Relative slowdown of the median duration
+        above which a benchmark is considered regressed.
+    :return: The regressed benchmarks, with their median
+        durations and the ratio of these durations.
+    """
+    previous = {(result['benchmark'], result['rows'], result['width']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        before = previous.get((result['benchmark'], result['rows'], result['width']))
+        if before is None or not before['median_seconds']:
+            continue
+        ratio = result['median_seconds'] / before['median_seconds']
+        if ratio > 1 + threshold:
+            regressions.append({'benchmark': result['benchmark'], 'rows': result['rows'], 'width': result['width'],
+                                'baseline_seconds': before['median_seconds'],
+                                'median_seconds': result['median_seconds'], 'ratio': ratio})
+    return regressions
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Benchmark the hot paths of datalite.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="numbers of records in the benchmarked tables")
+    parser.add_argument('--widths', nargs='+', choices=sorted(WIDTHS), default=sorted(WIDTHS),
+                        help="row widths of the benchmarked tables")
+    parser.add_argument('--operations', type=int, default=1000,
+                        help="number of operations in the benchmarks of single records")
+    parser.add_argument('--repeat', type=int, default=5, help="number of times each benchmark is timed")
+    parser.add_argument('--output', help="file the JSON results are written to, by default standard output")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare to")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative slowdown above which a benchmark is considered regressed")
+    args = parser.parse_args()
+    results = run(args.sizes, args.widths, args.operations, args.repeat)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as file:
+            results['regressions'] = compare(results, json.load(file), args.threshold)
+        exit_code = 1 if results['regressions'] else 0
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,2 @@
-__all__ = ['commons', 'datalite_decorator', 'fetch', 'migrations', 'datalite', 'constraints', 'mass_actions']
+__all__ = ['commons', 'datalite_decorator', 'fetch', 'migrations', 'datalite', 'constraints', 'mass_actions', 'connections', 'session', 'cache', 'query', 'aio', 'instrumentation']
 from .datalite_decorator import datalite
@@ -0,0 +1,446 @@
+"""
+datalite.aio module introduces an asyncio front-end to
+    datalite. Operations on a database are run by threads
+    dedicated to it, so they do not block the event loop, a
+    single writer thread coalesces the writes waiting for it
+    into a shared transaction, and a pool of reader threads
+    runs the reads concurrently.
+
+>>> student = Student(1, "Kurt Gödel")
+>>> await student.acreate_entry()
+>>> students = await afetch_where(Student, 'student_name', "Kurt Gödel")
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+import asyncio
+import queue
+import threading
+
+from .connections import _connect
+from .fetch import DEFAULT_BATCH_SIZE, fetch_all, fetch_count, fetch_equals, fetch_from, fetch_if, fetch_where, \
+    seek_all, seek_if, seek_where
+from .mass_actions import create_many, remove_many, update_many
+from .query import Condition, Query
+
+T = TypeVar('T')
+DEFAULT_READER_COUNT: int = 4
+MAX_COALESCED_WRITES: int = 256
+_Job = Tuple[Future, Callable[..., Any], Tuple[Any, ...], Dict[str, Any], Tuple[Any, ...]]
+
+
+def _restore_sync_states(states: List[Tuple[Any, Any]]) -> None:
+    """
+    Restore the states of objects whose writes are rolled
+    back, the earliest state of an object is restored last.
+
+    :param states: Objects and their states, given by
+        _TableInfo.sync_state, in the order they were taken.
+    :return: None.
+    """
+    for obj, state in reversed(states):
+        getattr(obj, '_table_info').restore_sync_state(obj, state)
+
+
+class _DatabaseExecutor:
+    """
+    The threads running the operations of a single database,
+        a writer thread and a pool of reader threads. Writes
+        waiting for the writer are run in a single transaction,
+        each in its own savepoint, so that a failing write is
+        rolled back without failing the others.
+    """
+
+    def __init__(self, db_path: str, reader_count: int = DEFAULT_READER_COUNT) -> None:
+        self.db_path: str = db_path
+        self._queue: 'queue.Queue[Optional[_Job]]' = queue.Queue()
+        self._readers = ThreadPoolExecutor(reader_count, thread_name_prefix=f"datalite-reader-{db_path}")
+        self._writer = threading.Thread(target=self._write_loop, name=f"datalite-writer-{db_path}", daemon=True)
+        self._writer.start()
+
+    def write(self, function: Callable[..., T], *args: Any, synced_objects: Iterable[Any] = (),
+              **kwargs: Any) -> 'Future[T]':
+        """
+        Schedule a write to the database.
+
+        :param function: Function writing to the database.
+        :param args: Positional arguments of the function.
+        :param synced_objects: Objects whose obj_id and modified fields
+            the function updates, they are restored if it is rolled back.
+        :param kwargs: Keyword arguments of the function.
+        :return: A future of the result of the function, set
+            once its transaction is committed.
+        """
+        future: 'Future[T]' = Future()
+        self._queue.put((future, function, args, kwargs, tuple(synced_objects)))
+        return future
+
+    def read(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> 'Future[T]':
+        """
+        Schedule a read from the database.
+
+        :param function: Function reading from the database.
+        :param args: Positional arguments of the function.
+        :param kwargs: Keyword arguments of the function.
+        :return: A future of the result of the function.
+        """
+        return self._readers.submit(function, *args, **kwargs)
+
+    def _write_loop(self) -> None:
+        """
+        Run the scheduled writes, in batches of the writes
+        waiting when the previous batch is done, until the
+        executor is closed.
+
+        :return: None.
+        """
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < MAX_COALESCED_WRITES:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._run_batch(batch)
+                    return
+                batch.append(job)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Job]) -> None:
+        """
+        Run a batch of writes in a single transaction, and
+        set their futures once it is committed, if it fails as
+        a whole, every future of the batch gets the error.
+
+        :param batch: The scheduled writes.
+        :return: None.
+        """
+        outcomes: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        states: List[Tuple[Any, Any]] = []  # States of the synced objects, restored if the batch fails.
+        try:
+            with _connect(self.db_path) as con:
+                if not con.in_transaction:
+                    con.execute("BEGIN")  # Otherwise releasing the savepoint would commit.
+                for future, function, args, kwargs, synced_objects in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    job_states = [(obj, getattr(obj, '_table_info').sync_state(obj)) for obj in synced_objects]
+                    con.execute("SAVEPOINT datalite_write")
+                    try:
+                        outcomes.append((future, function(*args, **kwargs), None))
+                        states += job_states
+                    except Exception as error:
+                        con.execute("ROLLBACK TO datalite_write")
+                        _restore_sync_states(job_states)
+                        outcomes.append((future, None, error))
+                    con.execute("RELEASE datalite_write")
+        except BaseException as error:  # The transaction failed as a whole, the writer keeps running.
+            _restore_sync_states(states)
+            for future, _, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self) -> None:
+        """
+        Run the scheduled writes and reads, then stop
+        the threads of the executor.
+
+        :return: None.
+        """
+        self._queue.put(None)
+        self._writer.join()
+        self._readers.shutdown()
+
+
+_executors: Dict[str, _DatabaseExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(db_path: str) -> _DatabaseExecutor:
+    """
+    Get the executor of a database, starting it if necessary.
+
+    :param db_path: Path of the database.
+    :return: The executor of the database.
+    """
+    with _executors_lock:
+        executor = _executors.get(db_path)
+        if executor is None:
+            executor = _executors[db_path] = _DatabaseExecutor(db_path)
+        return executor
+
+
+def close_executors(db_path: Optional[str] = None) -> None:
+    """
+    Stop the threads running the asynchronous operations
+    of a database, or of all databases if no path is given,
+    once their scheduled operations are done.
+
+    :param db_path: Path of the database, None for all.
+    :return: None.
+    """
+    with _executors_lock:
+        paths = [db_path] if db_path is not None else list(_executors)
+        executors = [_executors.pop(path) for path in paths if path in _executors]
+    for executor in executors:
+        executor.close()
+
+
+async def _write(db_path: str, function: Callable[..., T], *args: Any, synced_objects: Iterable[Any] = (),
+                 **kwargs: Any) -> T:
+    """
+    Run a write in the writer thread of a database.
+
+    :param db_path: Path of the database.
+    :param function: Function writing to the database.
+    :param synced_objects: Objects whose obj_id and modified fields
+        the function updates, they are restored if it is rolled back.
+    :return: The result of the function, once it is committed.
+    """
+    return await asyncio.wrap_future(_get_executor(db_path).write(function, *args, synced_objects=synced_objects,
+                                                                  **kwargs))
+
+
+async def _read(db_path: str, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a read in a reader thread of a database.
+
+    :param db_path: Path of the database.
+    :param function: Function reading from the database.
+    :return: The result of the function.
+    """
+    return await asyncio.wrap_future(_get_executor(db_path).read(function, *args, **kwargs))
+
+
+async def _acreate_entry(self, on_conflict: Optional[str] = None) -> None:
+    """
+    Asynchronous version of create_entry.
+    :param self: Instance of the object.
+    :param on_conflict: How an entry conflicting with a uniqueness
+        constraint is resolved, see create_entry.
+    :return: None.
+    """
+    await _write(getattr(self, 'db_path'), self.create_entry, on_conflict, synced_objects=(self, ))
+
+
+async def _aupdate_entry(self) -> None:
+    """
+    Asynchronous version of update_entry.
+    :param self: The object.
+    :return: None.
+    """
+    await _write(getattr(self, 'db_path'), self.update_entry, synced_objects=(self, ))
+
+
+async def _aremove_entry(self) -> None:
+    """
+    Asynchronous version of remove_entry.
+    :param self: self instance.
+    :return: None.
+    """
+    await _write(getattr(self, 'db_path'), self.remove_entry)
+
+
+async def acreate_many(objects: Iterable[T], on_conflict: Optional[str] = None) -> None:
+    """
+    Asynchronous version of create_many, the objects
+    are inserted in a single transaction.
+
+    :param objects: An iterable of objects decorated with datalite.
+    :param on_conflict: How records conflicting with a uniqueness
+        constraint are resolved, see create_many.
+    :return: None.
+    """
+    objects = list(objects)
+    if not objects:
+        raise ValueError("Collection is empty.")
+    await _write(getattr(objects[0], 'db_path'), create_many, objects, on_conflict=on_conflict,
+                 synced_objects=objects)
+
+
+async def aupdate_many(objects: Iterable[T], fields: Optional[Iterable[str]] = None) -> None:
+    """
+    Asynchronous version of update_many.
+
+    :param objects: Objects of the same datalite class to update.
+    :param fields: If given, only these fields are written.
+    :return: None.
+    """
+    objects = list(objects)
+    if objects:
+        await _write(getattr(objects[0], 'db_path'), update_many, objects, fields, synced_objects=objects)
+
+
+async def aremove_many(class_: type, ids: Iterable[int]) -> None:
+    """
+    Asynchronous version of remove_many.
+
+    :param class_: Class of the records.
+    :param ids: Object ids of the records to remove.
+    :return: None.
+    """
+    await _write(getattr(class_, 'db_path'), remove_many, class_, list(ids))
+
+
+async def afetch_from(class_: type, obj_id: int) -> Any:
+    """
+    Asynchronous version of fetch_from.
+
+    :param class_: Class to fetch from.
+    :param obj_id: Unique object id of the object.
+    :return: The fetched object.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_from, class_, obj_id)
+
+
+async def afetch_equals(class_: type, field: str, value: Any) -> Any:
+    """
+    Asynchronous version of fetch_equals.
+
+    :param class_: Class to fetch.
+    :param field: Field to check for.
+    :param value: Value of the field to check for.
+    :return: The fetched object.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_equals, class_, field, value)
+
+
+async def afetch_where(class_: type, field: str, value: Any, page: int = 0, element_count: int = 10,
+                      raw: bool = False) -> tuple:
+    """
+    Asynchronous version of fetch_where.
+
+    :param class_: Class of the records.
+    :param field: Field to check.
+    :param value: Value to check for.
+    :param page: Which page to retrieve, default all. (0 means closed).
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: A tuple of the records.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_where, class_, field, value, page, element_count, raw)
+
+
+async def afetch_if(class_: type, condition: Union[str, Condition, Query],
+                    page: int = 0, element_count: int = 10, raw: bool = False) -> tuple:
+    """
+    Asynchronous version of fetch_if.
+
+    :param class_: Class type to fetch.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression.
+    :param page: Which page to retrieve, default all. (0 means closed).
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: A tuple of records that fit the given condition.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_if, class_, condition, page, element_count, raw)
+
+
+async def afetch_all(class_: type, page: int = 0, element_count: int = 10, raw: bool = False) -> tuple:
+    """
+    Asynchronous version of fetch_all.
+
+    :param class_: Class of the records.
+    :param page: Which page to retrieve, default all. (0 means closed).
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: All the records of type class_.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_all, class_, page, element_count, raw)
+
+
+async def afetch_count(class_: type, condition: Union[str, Condition, None] = None) -> int:
+    """
+    Asynchronous version of fetch_count.
+
+    :param class_: Class of the records.
+    :param condition: Condition to check for, None for all records.
+    :return: Number of records.
+    """
+    return await _read(getattr(class_, 'db_path'), fetch_count, class_, condition)
+
+
+async def _aiter_pages(class_: type, seek: Callable[..., Tuple[tuple, Optional[str]]],
+                       *args: Any, batch_size: int, raw: bool) -> AsyncIterator[Any]:
+    """
+    Iterate over records asynchronously, by fetching them
+    one page at a time, each page being an independent read.
+
+    :param class_: Class of the records.
+    :param seek: Keyset pagination function, such as seek_all.
+    :param args: Arguments of the function, after the class.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: An asynchronous generator of class_ type objects.
+    """
+    continuation: Optional[str] = None
+    while True:
+        objects, continuation = await _read(getattr(class_, 'db_path'), seek, class_, *args,
+                                            continuation=continuation, element_count=batch_size, raw=raw)
+        for obj in objects:
+            yield obj
+        if continuation is None:
+            return
+
+
+def aiter_all(class_: type, batch_size: int = DEFAULT_BATCH_SIZE, raw: bool = False) -> AsyncIterator[Any]:
+    """
+    Asynchronous version of iter_all, records are fetched
+    a page at a time, so records written while iterating
+    may be seen.
+
+    :param class_: Class of the records.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: An asynchronous generator of class_ type objects.
+    """
+    return _aiter_pages(class_, seek_all, batch_size=batch_size, raw=raw)
+
+
+def aiter_if(class_: type, condition: Union[str, Condition], batch_size: int = DEFAULT_BATCH_SIZE,
+             raw: bool = False) -> AsyncIterator[Any]:
+    """
+    Asynchronous version of iter_if, records are fetched
+    a page at a time, in obj_id order.
+
+    :param class_: Class type to fetch.
+    :param condition: Condition to check for, either in SQL
+        syntax, or as a query expression.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: An asynchronous generator of class_ type objects.
+    """
+    return _aiter_pages(class_, seek_if, condition, batch_size=batch_size, raw=raw)
+
+
+def aiter_where(class_: type, field: str, value: Any, batch_size: int = DEFAULT_BATCH_SIZE,
+                raw: bool = False) -> AsyncIterator[Any]:
+    """
+    Asynchronous version of iter_where, records are fetched
+    a page at a time, in obj_id order.
+
+    :param class_: Class of the records.
+    :param field: Field to check.
+    :param value: Value to check for.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: An asynchronous generator of class_ type objects.
+    """
+    return _aiter_pages(class_, seek_where, field, value, batch_size=batch_size, raw=raw)
@@ -0,0 +1,169 @@
+"""
+datalite.cache module introduces the object cache, an
+    optional identity map of a datalite class that keeps
+    recently fetched objects by their obj_id.
+"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, NamedTuple, Optional, Tuple
+import threading
+
+
+class CacheInfo(NamedTuple):
+    """
+    Statistics of an object cache.
+    """
+    hits: int
+    misses: int
+    max_size: int
+    current_size: int
+
+
+class ObjectCache:
+    """
+    An identity map of the objects of a datalite class, keyed
+        by their obj_id. Least recently used objects are evicted
+        when it holds more than max_size objects, and objects older
+        than ttl seconds are considered stale.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None) -> None:
+        self.max_size: int = max_size
+        self.ttl: Optional[float] = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._objects: 'OrderedDict[int, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, obj_id: int) -> Optional[Any]:
+        """
+        Get the cached object with the given obj_id.
+
+        :param obj_id: Unique object id of the object.
+        :return: The cached object, None if it is not cached or stale.
+        """
+        with self._lock:
+            entry = self._objects.get(obj_id)
+            if entry is not None and self.ttl is not None and monotonic() - entry[0] > self.ttl:
+                del self._objects[obj_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._objects.move_to_end(obj_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, obj: Any) -> None:
+        """
+        Cache an object by its obj_id, replacing any
+        object cached with the same obj_id.
+
+        :param obj: Instance of the datalite class.
+        :return: None.
+        """
+        obj_id = getattr(obj, 'obj_id')
+        with self._lock:
+            self._objects[obj_id] = (monotonic(), obj)
+            self._objects.move_to_end(obj_id)
+            while len(self._objects) > self.max_size:
+                self._objects.popitem(last=False)
+
+    def add(self, obj: Any) -> Any:
+        """
+        Cache an object by its obj_id, unless another object
+        is cached with the same obj_id, so that a record has
+        a single instance.
+
+        :param obj: Instance of the datalite class.
+        :return: The instance of the record, the cached
+            object if any, otherwise the given one.
+        """
+        obj_id = getattr(obj, 'obj_id')
+        with self._lock:
+            entry = self._objects.get(obj_id)
+            if entry is not None and (self.ttl is None or monotonic() - entry[0] <= self.ttl):
+                self._objects.move_to_end(obj_id)
+                return entry[1]
+            self._objects[obj_id] = (monotonic(), obj)
+            self._objects.move_to_end(obj_id)
+            while len(self._objects) > self.max_size:
+                self._objects.popitem(last=False)
+            return obj
+
+    def written(self, obj: Any) -> None:
+        """
+        Update the cache after an object is written to its
+        record, another instance of the record cached is no
+        longer in sync with it, and is removed instead.
+
+        :param obj: Instance of the datalite class.
+        :return: None.
+        """
+        if self.add(obj) is not obj:
+            self.invalidate(getattr(obj, 'obj_id'))
+
+    def invalidate(self, obj_id: int) -> None:
+        """
+        Remove the object with the given obj_id from the cache.
+
+        :param obj_id: Unique object id of the object.
+        :return: None.
+        """
+        with self._lock:
+            self._objects.pop(obj_id, None)
+
+    def clear(self) -> None:
+        """
+        Remove all the objects from the cache.
+
+        :return: None.
+        """
+        with self._lock:
+            self._objects.clear()
+
+    def info(self) -> CacheInfo:
+        """
+        Get the statistics of the cache.
+
+        :return: Hits, misses, maximum and current size of the cache.
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.max_size, len(self._objects))
+
+
+def _get_cache(class_: type) -> Optional[ObjectCache]:
+    """
+    Get the object cache of a class.
+
+    :param class_: A datalite class.
+    :return: The object cache, None if the class has none.
+    """
+    return getattr(class_, '_object_cache', None)
+
+
+def cache_info(class_: type) -> CacheInfo:
+    """
+    Get the statistics of the object cache of a class.
+
+    :param class_: A datalite class with an object cache.
+    :return: Hits, misses, maximum and current size of the cache.
+    """
+    cache = _get_cache(class_)
+    if cache is None:
+        raise TypeError(f"{class_.__name__} does not have an object cache.")
+    return cache.info()
+
+
+def clear_cache(class_: type) -> None:
+    """
+    Remove all the objects from the object cache of a class,
+    this should be called if its records are modified outside
+    of datalite.
+
+    :param class_: A datalite class.
+    :return: None.
+    """
+    cache = _get_cache(class_)
+    if cache is not None:
+        cache.clear()
@@ -1,12 +1,15 @@
 from dataclasses import Field
-from typing import Any, Optional, Dict, List
-from .constraints import Unique
+from typing import Any, Callable, Optional, Dict, Iterable, List, Tuple, Union
+from .constraints import Index, Indexed, Unique
+from .cache import _get_cache
 import sqlite3 as sql
 
 
 type_table: Dict[Optional[type], str] = {None: "NULL", int: "INTEGER", float: "REAL",
                                          str: "TEXT", bytes: "BLOB", bool: "INTEGER"}
-type_table.update({Unique[key]: f"{value} NOT NULL UNIQUE" for key, value in type_table.items()})
+type_table.update({Indexed[key]: value for key, value in type_table.items()})
+type_table.update({Unique[key]: f"{value} NOT NULL UNIQUE" for key, value in type_table.items()
+                   if key in (None, int, float, str, bytes, bool)})
 
 
 def _convert_type(type_: Optional[type], type_overload: Dict[Optional[type], str]) -> str:
@@ -48,18 +51,6 @@ def _convert_sql_format(value: Any) -> str:
         return str(value)
 
 
-def _get_table_cols(cur: sql.Cursor, table_name: str) -> List[str]:
-    """
-    Get the column data of a table.
-
-    :param cur: Cursor in database.
-    :param table_name: Name of the table.
-    :return: the information about columns.
-    """
-    cur.execute(f"PRAGMA table_info({table_name});")
-    return [row_info[1] for row_info in cur.fetchall()][1:]
-
-
 def _get_default(default_object: object, type_overload: Dict[Optional[type], str]) -> str:
     """
     Check if the field's default object is filled,
@@ -75,19 +66,366 @@ def _get_default(default_object: object, type_overload: Dict[Optional[type], str
     return ""
 
 
-def _create_table(class_: type, cursor: sql.Cursor, type_overload: Dict[Optional[type], str] = type_table) -> None:
+def _column_definition(field: Field, type_overload: Dict[Optional[type], str] = type_table) -> str:
+    """
+    Get the definition of the column of a dataclass field,
+    as written in a CREATE TABLE or ADD COLUMN statement.
+    :param field: A dataclass field.
+    :param type_overload: Overload the Python -> SQLDatatype table
+    with a custom table, this is that custom table.
+    :return: The column definition.
+    """
+    return f"{field.name} {_convert_type(field.type, type_overload)}{_get_default(field.default, type_overload)}"
+
+
+def _create_table(class_: type, cursor: sql.Cursor, type_overload: Dict[Optional[type], str] = type_table,
+                  table_name: Optional[str] = None) -> None:
     """
     Create the table for a specific dataclass given
     :param class_: A dataclass.
     :param cursor: Current cursor instance.
     :param type_overload: Overload the Python -> SQLDatatype table
     with a custom table, this is that custom table.
+    :param table_name: Name of the table, by default the
+    lowercase name of the class.
     :return: None.
     """
     fields: List[Field] = [class_.__dataclass_fields__[key] for
                            key in class_.__dataclass_fields__.keys()]
     fields.sort(key=lambda field: field.name)  # Since dictionaries *may* be unsorted.
-    sql_fields = ', '.join(f"{field.name} {_convert_type(field.type, type_overload)}"
-                           f"{_get_default(field.default, type_overload)}" for field in fields)
+    sql_fields = ', '.join(_column_definition(field, type_overload) for field in fields)
     sql_fields = "obj_id INTEGER PRIMARY KEY AUTOINCREMENT, " + sql_fields
-    cursor.execute(f"CREATE TABLE IF NOT EXISTS {class_.__name__.lower()} ({sql_fields});")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name or class_.__name__.lower()} ({sql_fields});")
+
+
+def _is_indexed(type_: Any) -> bool:
+    """
+    Check if a field type is hinted with Indexed.
+
+    :param type_: Type of the field.
+    :return: If the type is Indexed[T] for some T.
+    """
+    return getattr(type_, '__origin__', None) is Union and \
+        any(getattr(arg, '__origin__', None) is frozenset for arg in type_.__args__)
+
+
+def _get_indexes(class_: type, indexes: Iterable[Index] = ()) -> Tuple[Index, ...]:
+    """
+    Collect the indexes of a dataclass, those declared by
+    hinting its fields with Indexed, and the given ones.
+
+    :param class_: A dataclass.
+    :param indexes: Indexes declared explicitly.
+    :return: All the indexes of the class.
+    """
+    indexes = tuple(Index(field.name) for field in class_.__dataclass_fields__.values()
+                    if _is_indexed(field.type)) + tuple(indexes)
+    for index in indexes:
+        for column in index.columns:
+            if column not in class_.__dataclass_fields__:
+                raise ValueError(f"Index column {column} is not a field of {class_.__name__}.")
+    return indexes
+
+
+def _index_name(table_name: str, index: Index) -> str:
+    """
+    Get the name of an index in the database.
+
+    :param table_name: Name of the table of the index.
+    :param index: The index.
+    :return: Its given name, otherwise one made of its columns.
+    """
+    return index.name or f"idx_{table_name}_{'_'.join(index.columns)}"
+
+
+def _create_indexes(class_: type, cursor: sql.Cursor, existing_columns: bool = False) -> None:
+    """
+    Create the indexes of a datalite class in its table.
+
+    :param class_: A datalite class.
+    :param cursor: Current cursor instance.
+    :param existing_columns: If True, indexes on columns the table
+        does not have yet, such as those of fields added since it was
+        created, are skipped, they are created once it is migrated.
+    :return: None.
+    """
+    table_name = class_.__name__.lower()
+    indexes = getattr(class_, '_indexes', ())
+    if existing_columns:
+        cursor.execute(f"PRAGMA table_info({table_name});")
+        columns = {row[1] for row in cursor.fetchall()}
+        indexes = [index for index in indexes if columns.issuperset(index.columns)]
+    for index in indexes:
+        name = _index_name(table_name, index)
+        where = f" WHERE {index.where}" if index.where else ""
+        cursor.execute(f"CREATE {'UNIQUE ' if index.unique else ''}INDEX IF NOT EXISTS {name} "
+                       f"ON {table_name} ({', '.join(index.columns)}){where};")
+
+
+def _to_bytes(value: Any) -> bytes:
+    """
+    Convert a value read from a BLOB column back to bytes.
+
+    :param value: Value read from the database.
+    :return: The value as bytes.
+    """
+    return value if isinstance(value, bytes) else bytes(value, encoding='utf-8')
+
+
+converter_table: Dict[Optional[type], Callable[[Any], Any]] = {bytes: _to_bytes, bool: bool}
+converter_table.update({wrapper[key]: value for key, value in converter_table.items() for wrapper in (Unique, Indexed)})
+
+
+def _compile_constructor(class_: type, columns: Tuple[str, ...],
+                         converters: Tuple[Tuple[int, Callable[[Any], Any]], ...],
+                         raw: bool, tracks_changes: bool) -> Callable[[Tuple[Any, ...]], Any]:
+    """
+    Generate the function converting a record selected with
+    _TableInfo.select_sql to an object of a class, with the
+    positions of the columns and their converters inlined.
+
+    :param class_: A datalite class.
+    :param columns: Names of the columns, in column order.
+    :param converters: Indices of the columns whose values
+        must be converted, and their converters.
+    :param raw: If True, the object is created without calling
+        __init__, and so __post_init__, its attributes being
+        assigned directly, otherwise it is created by the class.
+    :param tracks_changes: If the changes of the object are
+        tracked, see _TableInfo.mark_clean.
+    :return: The function, taking the record.
+    """
+    namespace: Dict[str, Any] = {'_class': class_, '_new': object.__new__, '_setattr': object.__setattr__}
+    converter_of = dict(converters)
+    values = []
+    for index, column in enumerate(columns):
+        value = f"record[{index + 1}]"
+        if index in converter_of:
+            namespace[f"_converter_{index}"] = converter_of[index]
+            value = f"(_converter_{index}({value}) if {value} is not None else None)"
+        values.append((column, value))
+    lines = []
+    if tracks_changes:
+        # The values are kept as the snapshot of the record, so they are computed once.
+        lines.append(f"values = ({''.join(f'{value}, ' for _, value in values)})" if converters else
+                     "values = record[1:]")
+        values = [(column, f"values[{index}]") for index, (column, _) in enumerate(values)]
+    if not raw:
+        lines += [f"obj = _class({', '.join(f'{column}={value}' for column, value in values)})",
+                  "obj.obj_id = record[0]"]
+        if tracks_changes:
+            lines.append("obj.__dict__['_clean_values'] = values")
+    elif '__slots__' in vars(class_):
+        lines += ["obj = _new(_class)", "_setattr(obj, 'obj_id', record[0])"] + \
+                 [f"_setattr(obj, {column!r}, {value})" for column, value in values]
+    else:
+        attributes = [('obj_id', 'record[0]')] + values + ([('_clean_values', 'values')] if tracks_changes else [])
+        lines += ["obj = _new(_class)",
+                  f"obj.__dict__.update({{{', '.join(f'{column!r}: {value}' for column, value in attributes)}}})"]
+    source = "def from_record(record):\n" + "".join(f"    {line}\n" for line in lines) + "    return obj\n"
+    exec(source, namespace)
+    return namespace['from_record']
+
+
+"""
+Ways to resolve an insertion conflicting with a uniqueness
+    constraint, see _TableInfo.upsert_sql.
+"""
+UPSERT_MODES: Tuple[str, ...] = ('ignore', 'replace', 'update')
+_NO_ID = object()  # obj_id of the objects that were never written, see _TableInfo.sync_state.
+
+
+class _TableInfo:
+    """
+    Schema and SQL statements of a datalite class, computed
+        once when the class is decorated and recomputed when
+        it is migrated.
+    """
+
+    def __init__(self, class_: type) -> None:
+        self.table_name: str = class_.__name__.lower()
+        self.columns: Tuple[str, ...] = tuple(sorted(class_.__dataclass_fields__.keys()))
+        self.field_types: Dict[str, Any] = {column: class_.__dataclass_fields__[column].type
+                                            for column in self.columns}
+        # Indices of the columns whose values must be converted after being read.
+        self.converters: Tuple[Tuple[int, Callable[[Any], Any]], ...] = tuple(
+            (index, converter_table[self.field_types[column]]) for index, column in enumerate(self.columns)
+            if self.field_types[column] in converter_table)
+        # Frozen dataclasses cannot change, and slotted ones have no room for the snapshot of their record.
+        self.tracks_changes: bool = not class_.__dataclass_params__.frozen and '__slots__' not in vars(class_)
+        # Constructors of the objects of selected records, see _compile_constructor.
+        self.from_record: Callable[[Tuple[Any, ...]], Any] = _compile_constructor(
+            class_, self.columns, self.converters, False, self.tracks_changes)
+        self.from_record_raw: Callable[[Tuple[Any, ...]], Any] = _compile_constructor(
+            class_, self.columns, self.converters, True, self.tracks_changes)
+        column_list = ', '.join(self.columns)
+        self.insert_sql: str = f"INSERT INTO {self.table_name}({column_list}) " \
+                               f"VALUES ({', '.join('?' for _ in self.columns)});"
+        # Bulk insertions give the obj_id of each record, from a range of reserved ids.
+        self.insert_with_id_sql: str = f"INSERT INTO {self.table_name}(obj_id, {column_list}) " \
+                                       f"VALUES (?, {', '.join('?' for _ in self.columns)});"
+        self.replace_with_id_sql: str = f"INSERT OR REPLACE{self.insert_with_id_sql[len('INSERT'):]}"
+        self.update_sql: str = f"UPDATE {self.table_name} " \
+                               f"SET {', '.join(column + ' = ?' for column in self.columns)} WHERE obj_id = ?;"
+        self.delete_sql: str = f"DELETE FROM {self.table_name} WHERE obj_id = ?;"
+        self.exists_sql: str = f"SELECT 1 FROM {self.table_name} WHERE obj_id = ?;"
+        self.select_sql: str = f"SELECT obj_id, {column_list} FROM {self.table_name}"
+        self._select_equals_sql: Dict[str, str] = {}
+        self._update_columns_sql: Dict[Tuple[str, ...], str] = {}
+        self._upsert_sql: Dict[str, str] = {}
+
+    def select_equals_sql(self, field: str) -> str:
+        """
+        Get the statement selecting the records whose field
+        equals a parameter.
+
+        :param field: Name of the field.
+        :return: The statement, without a terminating semicolon.
+        """
+        try:
+            return self._select_equals_sql[field]
+        except KeyError:
+            query = self._select_equals_sql[field] = f"{self.select_sql} WHERE {field} = ?"
+            return query
+
+    def update_columns_sql(self, columns: Tuple[str, ...]) -> str:
+        """
+        Get the statement updating only the given columns
+        of a record.
+
+        :param columns: Names of the columns, in column order.
+        :return: The statement.
+        """
+        try:
+            return self._update_columns_sql[columns]
+        except KeyError:
+            query = self._update_columns_sql[columns] = f"UPDATE {self.table_name} " \
+                f"SET {', '.join(column + ' = ?' for column in columns)} WHERE obj_id = ?;"
+            return query
+
+    def upsert_sql(self, on_conflict: str) -> str:
+        """
+        Get the statement inserting a record, resolving
+        conflicts with the uniqueness constraints of the
+        table as given, it returns the obj_id of the record
+        inserted or updated.
+
+        :param on_conflict: "ignore" to keep the existing record,
+            "replace" to delete it and insert the new one, or
+            "update" to overwrite its columns in place.
+        :return: The statement.
+        """
+        try:
+            return self._upsert_sql[on_conflict]
+        except KeyError:
+            pass
+        if on_conflict not in UPSERT_MODES:
+            raise ValueError(f"Unknown conflict resolution {on_conflict}, "
+                             f"expected one of {', '.join(UPSERT_MODES)}.")
+        if sql.sqlite_version_info < (3, 35, 0):
+            raise sql.NotSupportedError("Conflict resolution requires SQLite 3.35 or newer.")
+        column_list = ', '.join(self.columns)
+        values = f"VALUES ({', '.join('?' for _ in self.columns)})"
+        if on_conflict == 'replace':
+            query = f"INSERT OR REPLACE INTO {self.table_name}({column_list}) {values}"
+        elif on_conflict == 'ignore':
+            query = f"INSERT INTO {self.table_name}({column_list}) {values} ON CONFLICT DO NOTHING"
+        else:
+            query = f"INSERT INTO {self.table_name}({column_list}) {values} ON CONFLICT DO UPDATE " \
+                    f"SET {', '.join(f'{column} = excluded.{column}' for column in self.columns)}"
+        query = self._upsert_sql[on_conflict] = f"{query} RETURNING obj_id;"
+        return query
+
+    def dirty_columns(self, obj: Any) -> Optional[Tuple[str, ...]]:
+        """
+        Get the columns of an object modified since it
+        was last written to or read from the database.
+
+        :param obj: Instance of the datalite class.
+        :return: Names of the modified columns in column order,
+            None if the changes of the object are not tracked.
+        """
+        clean_values = vars(obj).get('_clean_values') if self.tracks_changes else None
+        if clean_values is None:
+            return None
+        return tuple(column for column, value, clean_value in zip(self.columns, self.values(obj), clean_values)
+                     if value is not clean_value and value != clean_value)
+
+    def mark_clean(self, obj: Any, columns: Optional[Tuple[str, ...]] = None) -> None:
+        """
+        Mark an object as in sync with its record, by keeping
+        a snapshot of its values, its changes are found by
+        comparing its values to the snapshot.
+
+        :param obj: Instance of the datalite class.
+        :param columns: If given, only these columns are marked
+            as in sync, provided the object has a snapshot.
+        :return: None.
+        """
+        if not self.tracks_changes:
+            return
+        values = self.values(obj)
+        if columns is not None:
+            clean_values = vars(obj).get('_clean_values')
+            if clean_values is None:
+                return
+            values = tuple(value if column in columns else clean_value
+                           for column, value, clean_value in zip(self.columns, values, clean_values))
+        vars(obj)['_clean_values'] = values
+
+    def sync_state(self, obj: Any) -> Tuple[Any, Optional[Tuple[Any, ...]]]:
+        """
+        Get the state of an object with respect to its record,
+        so that it can be restored if a write is rolled back.
+
+        :param obj: Instance of the datalite class.
+        :return: The obj_id of the object, _NO_ID if it has none,
+            and the snapshot of its record, see mark_clean.
+        """
+        clean_values = vars(obj).get('_clean_values') if self.tracks_changes else None
+        return getattr(obj, 'obj_id', _NO_ID), clean_values
+
+    def restore_sync_state(self, obj: Any, state: Tuple[Any, Optional[Tuple[Any, ...]]]) -> None:
+        """
+        Restore the state of an object given by sync_state,
+        the object is removed from the object cache, as its
+        values may not be those of its record.
+
+        :param obj: Instance of the datalite class.
+        :param state: State of the object, given by sync_state.
+        :return: None.
+        """
+        cache = _get_cache(obj.__class__)
+        if cache is not None and getattr(obj, 'obj_id', None) is not None:
+            cache.invalidate(getattr(obj, 'obj_id'))
+        obj_id, clean_values = state
+        if obj_id is not _NO_ID:
+            setattr(obj, 'obj_id', obj_id)
+        elif hasattr(obj, 'obj_id'):
+            delattr(obj, 'obj_id')
+        if clean_values is not None:
+            vars(obj)['_clean_values'] = clean_values
+        elif self.tracks_changes:
+            vars(obj).pop('_clean_values', None)
+
+    def values(self, obj: Any) -> Tuple[Any, ...]:
+        """
+        Get the values of an object in column order.
+
+        :param obj: Instance of the datalite class.
+        :return: Values of the fields of the object.
+        """
+        return tuple(getattr(obj, column) for column in self.columns)
+
+
+def _prepare_table_info(class_: type) -> _TableInfo:
+    """
+    Compute the table info of a class and store it in
+    the class.
+
+    :param class_: A datalite class.
+    :return: The table info of the class.
+    """
+    table_info = _TableInfo(class_)
+    setattr(class_, '_table_info', table_info)
+    return table_info
@@ -0,0 +1,319 @@
+"""
+datalite.connections module keeps a registry of connection
+    pools, one per database path. Every datalite operation
+    borrows its connection from the pool of its database
+    instead of opening a new one.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from warnings import warn
+from weakref import ref
+import sqlite3 as sql
+import threading
+
+from .instrumentation import _InstrumentedConnection
+
+DEFAULT_POOL_SIZE: int = 8
+
+"""
+Named PRAGMA profiles that can be applied to the
+    connections of a database, durable favors safety,
+    bulk-load favors write speed, balanced is in between.
+"""
+PRAGMA_PROFILES: Dict[str, Dict[str, Any]] = {
+    'durable': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'busy_timeout': 5000},
+    'balanced': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -65536,
+                 'temp_store': 'MEMORY', 'busy_timeout': 5000},
+    'bulk-load': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -262144,
+                  'mmap_size': 268435456, 'temp_store': 'MEMORY', 'busy_timeout': 5000},
+}
+
+
+def _resolve_pragmas(pragmas: Union[str, Dict[str, Any], None]) -> Dict[str, Any]:
+    """
+    Resolve a PRAGMA profile name or a dictionary of
+    PRAGMA names and values, validating them.
+
+    :param pragmas: Name of a profile in PRAGMA_PROFILES, or a
+        dictionary of PRAGMA names and values, or None.
+    :return: A dictionary of PRAGMA names and values.
+    """
+    if pragmas is None:
+        return {}
+    if isinstance(pragmas, str):
+        try:
+            return dict(PRAGMA_PROFILES[pragmas])
+        except KeyError:
+            raise ValueError(f"Unknown PRAGMA profile {pragmas}.")
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not (isinstance(value, int) or str(value).isidentifier()):
+            raise ValueError(f"Invalid PRAGMA {name} = {value}.")
+    return dict(pragmas)
+
+
+class ConnectionPool:
+    """
+    A pool of connections to a single sqlite3 database.
+        Each thread is bound to its own connection, up to
+        ``size`` of these connections are kept open between
+        operations, threads beyond this limit (or every thread,
+        if ``size`` is 0) open a new connection per call.
+    """
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE,
+                 pragmas: Union[str, Dict[str, Any], None] = None) -> None:
+        self.db_path: str = db_path
+        self.size: int = size
+        self.pragmas: Dict[str, Any] = _resolve_pragmas(pragmas)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation: int = 0
+        self._connections: List[Tuple[ref, sql.Connection]] = []
+        self._in_use: Set[sql.Connection] = set()  # Connections borrowed by a thread.
+
+    def _open(self) -> sql.Connection:
+        """
+        Open a new connection to the database of the pool.
+
+        :return: The new connection.
+        """
+        con = sql.connect(self.db_path, check_same_thread=False, factory=_InstrumentedConnection)
+        for name, value in self.pragmas.items():
+            con.execute(f"PRAGMA {name} = {value};")
+        return con
+
+    def configure(self, pragmas: Union[str, Dict[str, Any]]) -> None:
+        """
+        Set the PRAGMA profile applied to the connections of
+        the pool, kept connections are closed so that every
+        connection is reopened with the new profile.
+
+        :param pragmas: Name of a profile in PRAGMA_PROFILES, or a
+            dictionary of PRAGMA names and values.
+        :return: None.
+        """
+        self.pragmas = _resolve_pragmas(pragmas)
+        self.close_all()
+
+    def _prune(self) -> None:
+        """
+        Close the kept connections of threads that are no longer
+        alive, must be called with the lock held.
+
+        :return: None.
+        """
+        alive = []
+        for thread_ref, con in self._connections:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, con))
+            else:
+                con.close()
+        self._connections = alive
+
+    def _acquire(self) -> sql.Connection:
+        """
+        Borrow the connection bound to the current thread,
+        opening one if necessary. A connection is replaced
+        after close_all only once the thread returned it, so
+        nested borrowings always share the same connection.
+
+        :return: The connection of the current thread.
+        """
+        local = self._local
+        con = getattr(local, 'connection', None)
+        if con is not None and local.borrowed:
+            local.borrowed += 1
+            return con
+        with self._lock:
+            if con is not None and local.generation == self._generation:
+                self._in_use.add(con)
+                local.borrowed = 1
+                return con
+        con = self._open()
+        with self._lock:
+            self._prune()
+            kept = len(self._connections) < self.size
+            if kept:
+                self._connections.append((ref(threading.current_thread()), con))
+            self._in_use.add(con)
+            generation = self._generation
+        local.connection, local.kept, local.depth, local.borrowed, local.generation = con, kept, 0, 1, generation
+        return con
+
+    def _release(self) -> None:
+        """
+        Return the connection borrowed by the current thread,
+        once every borrowing is returned, it is closed if it is
+        not kept, or if close_all was called meanwhile.
+
+        :return: None.
+        """
+        local = self._local
+        local.borrowed -= 1
+        if local.borrowed:
+            return
+        con = local.connection
+        with self._lock:
+            self._in_use.discard(con)
+            stale = local.generation != self._generation
+        if stale or not local.kept:
+            local.connection = None
+            con.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sql.Connection]:
+        """
+        Borrow the connection of the current thread. Nested
+        usages share the same connection, the outermost one
+        commits on success and rolls back on failure.
+
+        :return: A context manager yielding the connection.
+        """
+        con = self._acquire()
+        local = self._local
+        local.depth += 1
+        try:
+            yield con
+            if local.depth == 1:
+                con.commit()
+        except BaseException:
+            if local.depth == 1:
+                con.rollback()
+            raise
+        finally:
+            local.depth -= 1
+            self._release()
+
+    @contextmanager
+    def reading(self) -> Iterator[sql.Connection]:
+        """
+        Borrow a connection for a long lived read, such as
+        a streaming fetch. Unlike ``connection``, it does not
+        take part in the transaction of the thread, so writes
+        made while reading are committed as usual.
+
+        :return: A context manager yielding the connection.
+        """
+        con = self._acquire()
+        local = self._local
+        if local.kept or local.depth:
+            try:
+                yield con
+            finally:
+                self._release()
+            return
+        local.connection, local.borrowed = None, 0  # A per call connection is kept private to the reader.
+        try:
+            yield con
+        finally:
+            with self._lock:
+                self._in_use.discard(con)
+            con.close()
+
+    def close_all(self) -> None:
+        """
+        Close all the connections kept by the pool, threads
+        will open new connections on their next operation, the
+        connections in use are closed once they are returned.
+
+        :return: None.
+        """
+        with self._lock:
+            for _, con in self._connections:
+                if con not in self._in_use:
+                    con.close()
+            self._connections = []
+            self._generation += 1
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_implicit_pools: Set[str] = set()  # Per-call pools of databases used before being registered.
+_registry_lock = threading.Lock()
+
+
+def register_pool(db_path: str, size: int = DEFAULT_POOL_SIZE,
+                  pragmas: Union[str, Dict[str, Any], None] = None) -> ConnectionPool:
+    """
+    Register a connection pool for a database, if the database
+    already has a pool, it is enlarged to the given size. As the
+    pool is shared by every class bound to the database, a size
+    of 0 conflicting with a registered pool of another size, or
+    the reverse, is ignored with a warning.
+
+    :param db_path: Path of the database.
+    :param size: Maximum number of connections kept open,
+        0 means a new connection is opened per call.
+    :param pragmas: If given, the PRAGMA profile applied to
+        every connection to the database, replacing any
+        previous profile.
+    :return: The pool of the database.
+    """
+    with _registry_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path, size, pragmas)
+            return pool
+        if db_path in _implicit_pools:
+            _implicit_pools.discard(db_path)
+            pool.size = size
+        elif (size == 0) != (pool.size == 0):
+            warn(f"The connections to {db_path} are {'not ' if pool.size == 0 else ''}pooled, "
+                 f"as registered first, the pool size {size} is ignored.", RuntimeWarning)
+        else:
+            pool.size = max(pool.size, size)
+    if pragmas is not None:
+        pool.configure(pragmas)
+    return pool
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """
+    Get the connection pool of a database, databases
+    without a registered pool get a per-call pool.
+
+    :param db_path: Path of the database.
+    :return: The pool of the database.
+    """
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _registry_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = ConnectionPool(db_path, 0)
+                _implicit_pools.add(db_path)
+    return pool
+
+
+def close_all(db_path: Optional[str] = None) -> None:
+    """
+    Close the pooled connections of a database, or
+    of all databases if no path is given.
+
+    :param db_path: Path of the database, None for all.
+    :return: None.
+    """
+    pools = [_pools[db_path]] if db_path in _pools else [] if db_path else list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def _connect(db_path: str) -> Iterator[sql.Connection]:
+    """
+    Borrow a connection to a database from its pool.
+
+    :param db_path: Path of the database.
+    :return: A context manager yielding the connection.
+    """
+    return get_pool(db_path).connection()
+
+
+def _connect_reader(db_path: str) -> Iterator[sql.Connection]:
+    """
+    Borrow a connection to a database from its pool,
+    for a long lived read.
+
+    :param db_path: Path of the database.
+    :return: A context manager yielding the connection.
+    """
+    return get_pool(db_path).reading()
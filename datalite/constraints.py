@@ -4,7 +4,7 @@ datalite.constraints module introduces constraint
     that can be used to signal datalite decorator
     constraints in the database.
 """
-from typing import TypeVar, Union, Tuple
+from typing import FrozenSet, Optional, TypeVar, Union, Tuple
 
 T = TypeVar('T')
 
@@ -24,3 +24,33 @@ Dataclass fields hinted with this type signals
 Unique = Union[Tuple[T], T]
 
 
+"""
+Dataclass fields hinted with this type signals
+    datalite decorator to create an index on the
+    bound column of this field in the table.
+"""
+Indexed = Union[FrozenSet[T], T]
+
+
+class Index:
+    """
+    Declares an index over one or more columns of the
+        table of a datalite class, to be passed to the
+        datalite decorator. If where is given, the index
+        is partial, it only covers the records fitting
+        this SQL condition. If unique is True, records
+        cannot share the same values in these columns.
+    """
+
+    def __init__(self, *columns: str, where: Optional[str] = None,
+                 unique: bool = False, name: Optional[str] = None) -> None:
+        if not columns:
+            raise ValueError("An index must have at least one column.")
+        self.columns: Tuple[str, ...] = columns
+        self.where: Optional[str] = where
+        self.unique: bool = unique
+        self.name: Optional[str] = name
+
+    def __repr__(self) -> str:
+        return f"Index({', '.join(repr(column) for column in self.columns)}, " \
+               f"where={self.where!r}, unique={self.unique!r}, name={self.name!r})"
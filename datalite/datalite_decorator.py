@@ -3,61 +3,82 @@ Defines the Datalite decorator that can be used to convert a dataclass to
 a class bound to a sqlite3 database.
 """
 from sqlite3.dbapi2 import IntegrityError
-from typing import Dict, Optional, Callable
-from dataclasses import asdict
+from typing import Any, Dict, Iterable, Optional, Callable, Union
 import sqlite3 as sql
 
-from .constraints import ConstraintFailedError
-from .commons import _convert_sql_format, _convert_type, _create_table, type_table
+from .constraints import ConstraintFailedError, Index
+from .commons import _create_indexes, _create_table, _get_indexes, _prepare_table_info, _TableInfo, type_table
+from .connections import DEFAULT_POOL_SIZE, _connect, register_pool
+from .cache import ObjectCache, _get_cache
+from .aio import _acreate_entry, _aremove_entry, _aupdate_entry
+from .instrumentation import _register_class
 
 
-def _create_entry(self) -> None:
+def _create_entry(self, on_conflict: Optional[str] = None) -> None:
     """
     Given an object, create the entry for the object. As a side-effect,
     this will set the object_id attribute of the object to the unique
     id of the entry.
     :param self: Instance of the object.
+    :param on_conflict: If given, how an entry conflicting with a
+        uniqueness constraint is resolved instead of raising
+        ConstraintFailedError, "ignore" keeps the existing entry and
+        sets obj_id to None, "replace" deletes it and creates the new
+        one, "update" overwrites it in place and sets obj_id to its id.
     :return: None.
     """
-    with sql.connect(getattr(self, "db_path")) as con:
+    table_info: _TableInfo = getattr(self, '_table_info')
+    cache = _get_cache(self.__class__)
+    with _connect(getattr(self, "db_path")) as con:
         cur: sql.Cursor = con.cursor()
-        table_name: str = self.__class__.__name__.lower()
-        kv_pairs = [item for item in asdict(self).items()]
-        kv_pairs.sort(key=lambda item: item[0])  # Sort by the name of the fields.
         try:
-            cur.execute(f"INSERT INTO {table_name}("
-                        f"{', '.join(item[0] for item in kv_pairs)})"
-                        f" VALUES ({', '.join('?' for item in kv_pairs)})",
-                        [item[1] for item in kv_pairs])
-            self.__setattr__("obj_id", cur.lastrowid)
-            con.commit()
+            if on_conflict is None:
+                cur.execute(table_info.insert_sql, table_info.values(self))
+                obj_id = cur.lastrowid
+            else:
+                records = cur.execute(table_info.upsert_sql(on_conflict), table_info.values(self)).fetchall()
+                obj_id = records[0][0] if records else None
         except IntegrityError:
             raise ConstraintFailedError("A constraint has failed.")
+        self.__setattr__("obj_id", obj_id)
+        table_info.mark_clean(self)
+    if cache is not None:
+        if on_conflict == 'replace':
+            cache.clear()  # The obj_id of the replaced record is unknown.
+        if obj_id is not None:
+            cache.written(self)  # Updating an existing record makes its cached instance stale.
 
 
 def _update_entry(self) -> None:
     """
-    Given an object, update the objects entry in the bound database.
+    Given an object, update the objects entry in the bound database,
+    only the fields modified since the object was created, fetched or
+    updated are written, if none are, the database is not touched.
     :param self: The object.
     :return: None.
     """
-    with sql.connect(getattr(self, "db_path")) as con:
-        cur: sql.Cursor = con.cursor()
-        table_name: str = self.__class__.__name__.lower()
-        kv_pairs = [item for item in asdict(self).items()]
-        kv_pairs.sort(key=lambda item: item[0])
-        query = f"UPDATE {table_name} " + \
-                f"SET {', '.join(item[0] + ' = ?' for item in kv_pairs)} " + \
-                f"WHERE obj_id = {getattr(self, 'obj_id')};"
-        cur.execute(query, [item[1] for item in kv_pairs])
-        con.commit()
+    table_info: _TableInfo = getattr(self, '_table_info')
+    columns = table_info.dirty_columns(self)
+    if columns is None:
+        columns = table_info.columns
+    if columns:
+        with _connect(getattr(self, "db_path")) as con:
+            cur: sql.Cursor = con.cursor()
+            cur.execute(table_info.update_columns_sql(columns),
+                        tuple(getattr(self, column) for column in columns) + (getattr(self, 'obj_id'), ))
+        table_info.mark_clean(self)
+    cache = _get_cache(self.__class__)
+    if cache is not None:
+        cache.written(self)
 
 
 def remove_from(class_: type, obj_id: int):
-    with sql.connect(getattr(class_, "db_path")) as con:
+    with _connect(getattr(class_, "db_path")) as con:
         cur: sql.Cursor = con.cursor()
-        cur.execute(f"DELETE FROM {class_.__name__.lower()} WHERE obj_id = ?", (obj_id, ))
-        con.commit()
+        cur.execute(getattr(class_, '_table_info').delete_sql, (obj_id, ))
+    cache = _get_cache(class_)
+    if cache is not None:
+        cache.invalidate(obj_id)
 
 
 def _remove_entry(self) -> None:
@@ -69,25 +90,55 @@ def _remove_entry(self) -> None:
     remove_from(self.__class__, getattr(self, 'obj_id'))
 
 
-def datalite(db_path: str, type_overload: Optional[Dict[Optional[type], str]] = None) -> Callable:
+def datalite(db_path: str, type_overload: Optional[Dict[Optional[type], str]] = None,
+             pooled: bool = True, pool_size: int = DEFAULT_POOL_SIZE,
+             cache_size: int = 0, cache_ttl: Optional[float] = None,
+             indexes: Optional[Iterable[Index]] = None,
+             pragmas: Optional[Union[str, Dict[str, Any]]] = None) -> Callable:
     """Bind a dataclass to a sqlite3 database. This adds new methods to the class, such as
-    `create_entry()`, `remove_entry()` and `update_entry()`.
+    `create_entry()`, `remove_entry()` and `update_entry()`, and their asynchronous
+    versions `acreate_entry()`, `aremove_entry()` and `aupdate_entry()`.
 
     :param db_path: Path of the database to be binded.
     :param type_overload: Type overload dictionary.
+    :param pooled: If True, connections to the database are kept open
+        in a pool shared by all the classes bound to it, otherwise a new
+        connection is opened per call. As connections are shared by the
+        classes bound to the database, the first class decorated decides,
+        a class disagreeing with it is bound with a warning.
+    :param pool_size: Maximum number of connections kept open in the pool.
+    :param cache_size: If given, objects fetched by their obj_id are kept in
+        an object cache of this size, that is, an identity map with LRU eviction.
+    :param cache_ttl: Seconds after which a cached object is considered stale,
+        by default cached objects do not expire.
+    :param indexes: Indexes to create on the table, in addition to the
+        ones declared by hinting fields with Indexed.
+    :param pragmas: PRAGMA profile applied to every connection to the database,
+        either the name of a profile in datalite.connections.PRAGMA_PROFILES,
+        such as "durable", "balanced" or "bulk-load", or a dictionary of PRAGMA
+        names and values.
     :return: The new dataclass.
     """
     def decorator(dataclass_: type, *args_i, **kwargs_i):
         types_table = type_table.copy()
         if type_overload is not None:
             types_table.update(type_overload)
-        with sql.connect(db_path) as con:
+        register_pool(db_path, pool_size if pooled else 0, pragmas)
+        setattr(dataclass_, '_indexes', _get_indexes(dataclass_, indexes or ()))
+        with _connect(db_path) as con:
             cur: sql.Cursor = con.cursor()
             _create_table(dataclass_, cur, types_table)
+            _create_indexes(dataclass_, cur, existing_columns=True)
         setattr(dataclass_, 'db_path', db_path)  # We add the path of the database to class itself.
         setattr(dataclass_, 'types_table', types_table)  # We add the type table for migration.
+        setattr(dataclass_, '_object_cache', ObjectCache(cache_size, cache_ttl) if cache_size else None)
+        _register_class(dataclass_)
+        _prepare_table_info(dataclass_)
         dataclass_.create_entry = _create_entry
         dataclass_.remove_entry = _remove_entry
         dataclass_.update_entry = _update_entry
+        dataclass_.acreate_entry = _acreate_entry
+        dataclass_.aremove_entry = _aremove_entry
+        dataclass_.aupdate_entry = _aupdate_entry
         return dataclass_
     return decorator
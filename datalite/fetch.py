@@ -1,6 +1,16 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from functools import lru_cache
+from binascii import Error as DecodeError
+from typing import Tuple, Any, Callable, Iterator, Iterable, Optional, Union
 import sqlite3 as sql
-from typing import List, Tuple, Any
-from .commons import _convert_sql_format, _get_table_cols
+from .commons import _TableInfo, converter_table
+from .connections import _connect, _connect_reader
+from .cache import _get_cache
+from .query import Condition, Query, _compile_condition
+
+DEFAULT_BATCH_SIZE: int = 1000
+MAX_VARIABLE_COUNT: int = 999  # Default SQLITE_MAX_VARIABLE_NUMBER of older SQLite versions.
 
 
 def _insert_pagination(query: str, page: int, element_count: int) -> str:
@@ -17,6 +27,38 @@ def _insert_pagination(query: str, page: int, element_count: int) -> str:
     return query + ";"
 
 
+def _encode_continuation(table_name: str, obj_id: int) -> str:
+    """
+    Encode the position of the last record of a page
+    into a continuation token.
+
+    :param table_name: Name of the table paginated.
+    :param obj_id: obj_id of the last record of the page.
+    :return: The continuation token.
+    """
+    return urlsafe_b64encode(f"{table_name}:{obj_id}".encode('utf-8')).decode('ascii')
+
+
+def _decode_continuation(table_name: str, continuation: Optional[str]) -> int:
+    """
+    Decode a continuation token back into the obj_id
+    the next page starts after.
+
+    :param table_name: Name of the table paginated.
+    :param continuation: Continuation token, None for the first page.
+    :return: The obj_id the next page starts after.
+    """
+    if continuation is None:
+        return 0
+    try:
+        token_table, obj_id = urlsafe_b64decode(continuation.encode('ascii')).decode('utf-8').rsplit(':', 1)
+        if token_table == table_name:
+            return int(obj_id)
+    except (DecodeError, UnicodeError, ValueError):
+        pass
+    raise ValueError(f"Invalid continuation token for table {table_name}.")
+
+
 def is_fetchable(class_: type, obj_id: int) -> bool:
     """
     Check if a record is fetchable given its obj_id and
@@ -26,13 +68,40 @@ def is_fetchable(class_: type, obj_id: int) -> bool:
     :param obj_id: Unique obj_id of the object.
     :return: If the object is fetchable.
     """
-    with sql.connect(getattr(class_, 'db_path')) as con:
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    with _connect(getattr(class_, 'db_path')) as con:
         cur: sql.Cursor = con.cursor()
         try:
-            cur.execute(f"SELECT 1 FROM {class_.__name__.lower()} WHERE obj_id = ?;", (obj_id, ))
+            cur.execute(table_info.exists_sql, (obj_id, ))
         except sql.OperationalError:
-            raise KeyError(f"Table {class_.__name__.lower()} does not exist.")
-    return bool(cur.fetchall())
+            raise KeyError(f"Table {table_info.table_name} does not exist.")
+        return bool(cur.fetchall())
+
+
+def _fetch_equals(class_: type, field: str, value: Any) -> Optional[Any]:
+    """
+    Fetch the first record whose field equals the value,
+    bypassing the object cache of the class, but caching
+    the fetched object, if an instance of the record is
+    already cached, it is returned instead.
+
+    :param class_: Class to fetch.
+    :param field: Field to check for.
+    :param value: Value of the field to check for.
+    :return: The fetched object, None if no record fits.
+    """
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(table_info.select_equals_sql(field), (value, ))
+        record = cur.fetchone()
+    if record is None:
+        return None
+    obj = _convert_record_to_object(class_, record)
+    cache = _get_cache(class_)
+    if cache is not None:
+        obj = cache.add(obj)
+    return obj
 
 
 def fetch_equals(class_: type, field: str, value: Any, ) -> Any:
@@ -42,18 +111,15 @@ def fetch_equals(class_: type, field: str, value: Any, ) -> Any:
     :param class_: Class to fetch.
     :param field: Field to check for, by default, object id.
     :param value: Value of the field to check for.
-    :return: The object whose data is taken from the database.
+    :return: The object whose data is taken from the database,
+        None if no record fits.
     """
-    table_name = class_.__name__.lower()
-    with sql.connect(getattr(class_, 'db_path')) as con:
-        cur: sql.Cursor = con.cursor()
-        cur.execute(f"SELECT * FROM {table_name} WHERE {field} = ?;", (value, ))
-        obj_id, *field_values = list(cur.fetchone())
-        field_names: List[str] = _get_table_cols(cur, class_.__name__.lower())
-    kwargs = dict(zip(field_names, field_values))
-    obj = class_(**kwargs)
-    setattr(obj, "obj_id", obj_id)
-    return obj
+    cache = _get_cache(class_)
+    if cache is not None and field == 'obj_id':
+        obj = cache.get(value)
+        if obj is not None:
+            return obj
+    return _fetch_equals(class_, field, value)
 
 
 def fetch_from(class_: type, obj_id: int) -> Any:
@@ -64,54 +130,96 @@ def fetch_from(class_: type, obj_id: int) -> Any:
     :param obj_id: Unique object id of the object.
     :return: The fetched object.
     """
-    if not is_fetchable(class_, obj_id):
+    cache = _get_cache(class_)
+    obj = cache.get(obj_id) if cache is not None else None
+    if obj is None:
+        try:
+            obj = _fetch_equals(class_, 'obj_id', obj_id)
+        except sql.OperationalError:
+            raise KeyError(f"Table {getattr(class_, '_table_info').table_name} does not exist.")
+    if obj is None:
         raise KeyError(f"An object with {obj_id} of type {class_.__name__} does not exist, or"
                        f"otherwise is unreachable.")
-    return fetch_equals(class_, 'obj_id', obj_id)
+    return obj
 
 
-def _convert_record_to_object(class_: type, record: Tuple[Any], field_names: List[str]) -> Any:
+def _convert_record_to_object(class_: type, record: Tuple[Any], raw: bool = False) -> Any:
     """
     Convert a given record fetched from an SQL instance to a Python Object of given class_.
 
     :param class_: Class type to convert the record to.
     :param record: Record to get data from.
-    :param field_names: Field names of the class.
+    :param raw: If True, the object is created without calling
+        the __init__ and __post_init__ of the class.
     :return: the created object.
     """
-    kwargs = dict(zip(field_names, record[1:]))
-    field_types = {key: value.type for key, value in class_.__dataclass_fields__.items()}
-    for key in kwargs:
-        if field_types[key] == bytes:
-            kwargs[key] = bytes(kwargs[key], encoding='utf-8')
-    obj_id = record[0]
-    obj = class_(**kwargs)
-    setattr(obj, "obj_id", obj_id)
-    return obj
+    return _constructor(class_, raw)(record)
+
+
+def _constructor(class_: type, raw: bool) -> Callable[[Tuple[Any, ...]], Any]:
+    """
+    Get the function converting the records of class_ to
+    objects, generated when the class was decorated.
+
+    :param class_: Class type of the records.
+    :param raw: If True, the function creating objects without
+        calling the __init__ and __post_init__ of the class.
+    :return: The function, taking a record.
+    """
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    return table_info.from_record_raw if raw else table_info.from_record
+
+
+def _fetch_objects(class_: type, query: str, parameters: Tuple[Any, ...] = (), raw: bool = False) -> tuple:
+    """
+    Run a select query on the table of class_ and convert
+    the resulting records to objects.
+
+    :param class_: Class type of the records.
+    :param query: Query to run.
+    :param parameters: Parameters bound to the query.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: A tuple of class_ type objects.
+    """
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(query, parameters)
+        records: list = cur.fetchall()
+    return tuple(map(_constructor(class_, raw), records))
 
 
-def fetch_if(class_: type, condition: str, page: int = 0, element_count: int = 10) -> tuple:
+def fetch_if(class_: type, condition: Union[str, Condition, Query], page: int = 0, element_count: int = 10,
+             raw: bool = False) -> tuple:
     """
     Fetch all class_ type variables from the bound db,
     provided they fit the given condition
 
     :param class_: Class type to fetch.
-    :param condition: Condition to check for.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression, which may also order and limit
+        the records.
     :param page: Which page to retrieve, default all. (0 means closed).
     :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
     :return: A tuple of records that fit the given condition
         of given type class_.
     """
-    table_name = class_.__name__.lower()
-    with sql.connect(getattr(class_, 'db_path')) as con:
-        cur: sql.Cursor = con.cursor()
-        cur.execute(_insert_pagination(f"SELECT * FROM {table_name} WHERE {condition}", page, element_count))
-        records: list = cur.fetchall()
-        field_names: List[str] = _get_table_cols(cur, table_name)
-    return tuple(_convert_record_to_object(class_, record, field_names) for record in records)
+    where, parameters, tail = _compile_condition(condition)
+    query = f"{getattr(class_, '_table_info').select_sql} WHERE {where}"
+    if tail is None:
+        query = _insert_pagination(query, page, element_count)
+    elif page:
+        raise ValueError("A query with an order or a limit cannot be paginated.")
+    else:
+        query += tail
+    return _fetch_objects(class_, query, parameters, raw)
 
 
-def fetch_where(class_: type, field: str, value: Any, page: int = 0, element_count: int = 10) -> tuple:
+def fetch_where(class_: type, field: str, value: Any, page: int = 0, element_count: int = 10,
+                raw: bool = False) -> tuple:
     """
     Fetch all class_ type variables from the bound db,
     provided that the field of the records fit the
@@ -122,43 +230,422 @@ def fetch_where(class_: type, field: str, value: Any, page: int = 0, element_cou
     :param value: Value to check for.
     :param page: Which page to retrieve, default all. (0 means closed).
     :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
     :return: A tuple of the records.
     """
-    return fetch_if(class_, f"{field} = {_convert_sql_format(value)}", page, element_count)
+    select_equals_sql = getattr(class_, '_table_info').select_equals_sql(field)
+    return _fetch_objects(class_, _insert_pagination(select_equals_sql, page, element_count), (value, ), raw)
+
+
+def fetch_many_ids(class_: type, ids: Iterable[int], raw: bool = False) -> tuple:
+    """
+    Fetch the records with the given object ids, ids
+    that do not exist are skipped.
 
+    :param class_: Class of the records.
+    :param ids: Object ids of the records.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A tuple of class_ type objects, in the
+        order of the given ids.
+    """
+    ids = list(ids)
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    objects = {}
+    with _connect(getattr(class_, 'db_path')):
+        for i in range(0, len(ids), MAX_VARIABLE_COUNT):
+            chunk = tuple(ids[i:i + MAX_VARIABLE_COUNT])
+            query = f"{table_info.select_sql} WHERE obj_id IN ({', '.join('?' for _ in chunk)});"
+            objects.update((getattr(obj, 'obj_id'), obj) for obj in _fetch_objects(class_, query, chunk, raw))
+    return tuple(objects[obj_id] for obj_id in ids if obj_id in objects)
 
-def fetch_range(class_: type, range_: range) -> tuple:
+
+def fetch_range(class_: type, range_: range, raw: bool = False) -> tuple:
     """
     Fetch the records in a given range of object ids.
 
     :param class_: Class of the records.
     :param range_: Range of the object ids.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
     :return: A tuple of class_ type objects whose values
         come from the class_' bound database.
     """
-    return tuple(fetch_from(class_, obj_id) for obj_id in range_ if is_fetchable(class_, obj_id))
+    if range_.step != 1:
+        return fetch_many_ids(class_, range_, raw)
+    select_sql = getattr(class_, '_table_info').select_sql
+    return _fetch_objects(class_, f"{select_sql} WHERE obj_id BETWEEN ? AND ? ORDER BY obj_id;",
+                          (range_.start, range_.stop - 1), raw)
 
 
-def fetch_all(class_: type, page: int = 0, element_count: int = 10) -> tuple:
+def fetch_all(class_: type, page: int = 0, element_count: int = 10, raw: bool = False) -> tuple:
     """
     Fetchall the records in the bound database.
 
     :param class_: Class of the records.
     :param page: Which page to retrieve, default all. (0 means closed).
     :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
     :return: All the records of type class_ in
         the bound database as a tuple.
     """
-    try:
-        db_path = getattr(class_, 'db_path')
-    except AttributeError:
+    if not hasattr(class_, 'db_path'):
         raise TypeError("Given class is not decorated with datalite.")
-    with sql.connect(db_path) as con:
+    select_sql = getattr(class_, '_table_info').select_sql
+    try:
+        return _fetch_objects(class_, _insert_pagination(select_sql, page, element_count), raw=raw)
+    except sql.OperationalError:
+        raise TypeError(f"No record of type {class_.__name__.lower()}")
+
+
+def _iter_objects(class_: type, query: str, parameters: Tuple[Any, ...] = (),
+                  batch_size: int = DEFAULT_BATCH_SIZE, raw: bool = False) -> Iterator[Any]:
+    """
+    Run a select query on the table of class_ and lazily
+    convert the resulting records to objects, fetching
+    batch_size records at a time.
+
+    :param class_: Class type of the records.
+    :param query: Query to run.
+    :param parameters: Parameters bound to the query.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: A generator of class_ type objects.
+    """
+    from_record = _constructor(class_, raw)
+    with _connect_reader(getattr(class_, 'db_path')) as con:
         cur: sql.Cursor = con.cursor()
         try:
-            cur.execute(_insert_pagination(f"SELECT * FROM {class_.__name__.lower()}", page, element_count))
-        except sql.OperationalError:
-            raise TypeError(f"No record of type {class_.__name__.lower()}")
+            cur.execute(query, parameters)
+            records = cur.fetchmany(batch_size)
+            while records:
+                yield from map(from_record, records)
+                records = cur.fetchmany(batch_size)
+        finally:
+            cur.close()
+
+
+def iter_all(class_: type, batch_size: int = DEFAULT_BATCH_SIZE, raw: bool = False) -> Iterator[Any]:
+    """
+    Iterate over all the records in the bound database,
+    unlike fetch_all, records are fetched lazily, so the
+    memory usage does not depend on the size of the table.
+
+    :param class_: Class of the records.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A generator of class_ type objects.
+    """
+    if not hasattr(class_, 'db_path'):
+        raise TypeError("Given class is not decorated with datalite.")
+    return _iter_objects(class_, getattr(class_, '_table_info').select_sql, batch_size=batch_size, raw=raw)
+
+
+def iter_if(class_: type, condition: Union[str, Condition, Query],
+            batch_size: int = DEFAULT_BATCH_SIZE, raw: bool = False) -> Iterator[Any]:
+    """
+    Iterate over the records in the bound database that
+    fit the given condition, fetching them lazily.
+
+    :param class_: Class type to fetch.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A generator of class_ type objects.
+    """
+    where, parameters, tail = _compile_condition(condition)
+    select_sql = getattr(class_, '_table_info').select_sql
+    return _iter_objects(class_, f"{select_sql} WHERE {where}{tail or ''}", parameters, batch_size, raw)
+
+
+def iter_where(class_: type, field: str, value: Any, batch_size: int = DEFAULT_BATCH_SIZE,
+               raw: bool = False) -> Iterator[Any]:
+    """
+    Iterate over the records in the bound database whose
+    field fit the given value, fetching them lazily.
+
+    :param class_: Class of the records.
+    :param field: Field to check.
+    :param value: Value to check for.
+    :param batch_size: Number of records fetched at a time.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A generator of class_ type objects.
+    """
+    select_equals_sql = getattr(class_, '_table_info').select_equals_sql(field)
+    return _iter_objects(class_, select_equals_sql, (value, ), batch_size, raw)
+
+
+def _seek_objects(class_: type, query: str, parameters: Tuple[Any, ...], continuation: Optional[str],
+                  element_count: int, raw: bool = False) -> Tuple[tuple, Optional[str]]:
+    """
+    Fetch a page of records using keyset pagination, the
+    page is located by seeking to the obj_id after the
+    one encoded in the continuation token.
+
+    :param class_: Class type of the records.
+    :param query: Select query with a WHERE clause, without the seek condition.
+    :param parameters: Parameters bound to the query.
+    :param continuation: Continuation token of the previous page, None for the first page.
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling
+        the __init__ and __post_init__ of the class.
+    :return: A tuple of the records in the page and the continuation
+        token of the next page, None if this is the last page.
+    """
+    table_name = getattr(class_, '_table_info').table_name
+    last_id = _decode_continuation(table_name, continuation)
+    objects = _fetch_objects(class_, f"{query} AND obj_id > ? ORDER BY obj_id LIMIT ?;",
+                             parameters + (last_id, element_count), raw)
+    if len(objects) < element_count:
+        return objects, None
+    return objects, _encode_continuation(table_name, getattr(objects[-1], 'obj_id'))
+
+
+def seek_all(class_: type, continuation: Optional[str] = None, element_count: int = 10,
+             raw: bool = False) -> Tuple[tuple, Optional[str]]:
+    """
+    Fetch a page of the records in the bound database, unlike
+    the page argument of fetch_all, the cost of fetching a page
+    does not grow with its position.
+
+    :param class_: Class of the records.
+    :param continuation: Continuation token returned with the previous
+        page, None for the first page.
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A tuple of the records in the page and the continuation
+        token of the next page, None if this is the last page.
+    """
+    if not hasattr(class_, 'db_path'):
+        raise TypeError("Given class is not decorated with datalite.")
+    select_sql = getattr(class_, '_table_info').select_sql
+    return _seek_objects(class_, f"{select_sql} WHERE 1", (), continuation, element_count, raw)
+
+
+def seek_if(class_: type, condition: Union[str, Condition], continuation: Optional[str] = None,
+            element_count: int = 10, raw: bool = False) -> Tuple[tuple, Optional[str]]:
+    """
+    Fetch a page of the records in the bound database that
+    fit the given condition, using keyset pagination.
+
+    :param class_: Class type to fetch.
+    :param condition: Condition to check for, either in SQL
+        syntax or as a query expression.
+    :param continuation: Continuation token returned with the previous
+        page, None for the first page.
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A tuple of the records in the page and the continuation
+        token of the next page, None if this is the last page.
+    """
+    where, parameters, tail = _compile_condition(condition)
+    if tail is not None:
+        raise ValueError("Keyset pagination orders records by obj_id, queries cannot be used.")
+    select_sql = getattr(class_, '_table_info').select_sql
+    return _seek_objects(class_, f"{select_sql} WHERE ({where})", parameters, continuation, element_count, raw)
+
+
+def seek_where(class_: type, field: str, value: Any, continuation: Optional[str] = None,
+               element_count: int = 10, raw: bool = False) -> Tuple[tuple, Optional[str]]:
+    """
+    Fetch a page of the records in the bound database whose
+    field fit the given value, using keyset pagination.
+
+    :param class_: Class of the records.
+    :param field: Field to check.
+    :param value: Value to check for.
+    :param continuation: Continuation token returned with the previous
+        page, None for the first page.
+    :param element_count: Element count in each page.
+    :param raw: If True, objects are created without calling the
+        __init__ and __post_init__ of the class, which is faster,
+        but skips any validation they do, for trusted records.
+    :return: A tuple of the records in the page and the continuation
+        token of the next page, None if this is the last page.
+    """
+    select_equals_sql = getattr(class_, '_table_info').select_equals_sql(field)
+    return _seek_objects(class_, select_equals_sql, (value, ), continuation, element_count, raw)
+
+
+def _where(condition: Union[str, Condition, Query, None]) -> Tuple[str, Tuple[Any, ...], Optional[str]]:
+    """
+    Compile an optional condition into a WHERE clause.
+
+    :param condition: The condition, None for all records.
+    :return: The WHERE clause, its parameters and the ORDER BY
+        and LIMIT clauses of a query, if any.
+    """
+    if condition is None:
+        return "", (), None
+    where, parameters, tail = _compile_condition(condition)
+    return f" WHERE {where}", parameters, tail
+
+
+def fetch_count(class_: type, condition: Union[str, Condition, None] = None) -> int:
+    """
+    Count the records in the bound database, provided
+    they fit the given condition, without fetching them.
+
+    :param class_: Class of the records.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression, None to count all records.
+    :return: Number of records.
+    """
+    where, parameters, tail = _where(condition)
+    if tail is not None:
+        raise ValueError("Counted records cannot be ordered or limited.")
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(f"SELECT count(*) FROM {getattr(class_, '_table_info').table_name}{where};", parameters)
+        return cur.fetchone()[0]
+
+
+def fetch_exists(class_: type, condition: Union[str, Condition, None] = None) -> bool:
+    """
+    Check if any record in the bound database fits the
+    given condition, without fetching it.
+
+    :param class_: Class of the records.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression, None to check for any record.
+    :return: If a record fits the condition.
+    """
+    where, parameters, tail = _where(condition)
+    if tail is not None:
+        raise ValueError("Checked records cannot be ordered or limited.")
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {getattr(class_, '_table_info').table_name}{where});",
+                    parameters)
+        return bool(cur.fetchone()[0])
+
+
+def _as_fields(table_info: _TableInfo, fields: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """
+    Normalise one or many field names to a tuple, checking
+    that they are fields of the class.
+
+    :param table_info: Table info of the class.
+    :param fields: A field name, an iterable of field names, or None.
+    :return: A tuple of field names.
+    """
+    if fields is None:
+        return ()
+    fields = (fields, ) if isinstance(fields, str) else tuple(fields)
+    for field in fields:
+        if field != 'obj_id' and field not in table_info.columns:
+            raise ValueError(f"{field} is not a field of the table {table_info.table_name}.")
+    return fields
+
+
+@lru_cache(maxsize=None)
+def _row_type(table_name: str, fields: Tuple[str, ...]) -> type:
+    """
+    Get the named tuple type of the rows of a projection.
+
+    :param table_name: Name of the table projected.
+    :param fields: Names of the projected fields.
+    :return: A named tuple type.
+    """
+    return namedtuple(f"{table_name}_row", fields)
+
+
+def fetch_columns(class_: type, fields: Iterable[str], condition: Union[str, Condition, Query, None] = None,
+                  named: bool = False) -> tuple:
+    """
+    Fetch only the given fields of the records in the bound
+    database, provided they fit the given condition. Records
+    are returned as tuples instead of class_ type objects.
+
+    :param class_: Class of the records.
+    :param fields: Names of the fields to fetch, obj_id included.
+    :param condition: Condition to check for, either in SQL syntax,
+        or as a query expression, None for all records.
+    :param named: If True, records are returned as named tuples.
+    :return: A tuple of the records, as tuples of the field values
+        in the given order.
+    """
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    fields = _as_fields(table_info, fields)
+    converters = [(index, converter_table[table_info.field_types[field]]) for index, field in enumerate(fields)
+                  if field != 'obj_id' and table_info.field_types[field] in converter_table]
+    where, parameters, tail = _where(condition)
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(f"SELECT {', '.join(fields)} FROM {table_info.table_name}{where}{tail or ''};", parameters)
+        records = cur.fetchall()
+    if converters:
+        records = [list(record) for record in records]
+        for record in records:
+            for index, converter in converters:
+                if record[index] is not None:
+                    record[index] = converter(record[index])
+    if named:
+        row_type = _row_type(table_info.table_name, fields)
+        return tuple(row_type._make(record) for record in records)
+    return tuple(tuple(record) for record in records) if converters else tuple(records)
+
+
+def aggregate(class_: type, group_by: Union[str, Iterable[str], None] = None,
+              where: Union[str, Condition, None] = None, count: bool = False,
+              sum: Union[str, Iterable[str], None] = None, avg: Union[str, Iterable[str], None] = None,
+              min: Union[str, Iterable[str], None] = None, max: Union[str, Iterable[str], None] = None) -> tuple:
+    """
+    Aggregate the records in the bound database inside
+    the database, optionally grouping them by fields.
+
+    >>> aggregate(Student, group_by='student_class', avg='student_gpa', count=True)
+    (student_row(student_class=1, count=30, avg_student_gpa=3.1), ...)
+
+    :param class_: Class of the records.
+    :param group_by: Field or fields to group the records by.
+    :param where: Condition the aggregated records must fit, either
+        in SQL syntax or as a query expression.
+    :param count: If True, count the records in each group.
+    :param sum: Field or fields to sum.
+    :param avg: Field or fields to average.
+    :param min: Field or fields to get the minimum of.
+    :param max: Field or fields to get the maximum of.
+    :return: A tuple of named tuples, one for each group, holding the
+        group_by fields followed by count and the aggregates, named
+        as function_field, such as sum_price.
+    """
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    groups = _as_fields(table_info, group_by)
+    aggregates = [(function, field) for function, fields in (('sum', sum), ('avg', avg), ('min', min), ('max', max))
+                  for field in _as_fields(table_info, fields)]
+    if not count and not aggregates:
+        raise ValueError("No aggregate is given.")
+    columns = list(groups) + (['count(*)'] if count else []) + \
+        [f"{function}({field})" for function, field in aggregates]
+    names = groups + (('count', ) if count else ()) + tuple(f"{function}_{field}" for function, field in aggregates)
+    where_sql, parameters, tail = _where(where)
+    if tail is not None:
+        raise ValueError("Aggregated records cannot be ordered or limited.")
+    query = f"SELECT {', '.join(columns)} FROM {table_info.table_name}{where_sql}"
+    if groups:
+        query += f" GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}"
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(query + ";", parameters)
         records = cur.fetchall()
-        field_names: List[str] = _get_table_cols(cur, class_.__name__.lower())
-    return tuple(_convert_record_to_object(class_, record, field_names) for record in records)
+    row_type = _row_type(table_info.table_name, names)
+    return tuple(row_type._make(record) for record in records)
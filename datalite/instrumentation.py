@@ -0,0 +1,308 @@
+"""
+datalite.instrumentation module introduces query hooks,
+    functions called with a QueryEvent after each statement
+    datalite runs, and two of these hooks, a collector of
+    latency statistics per class and operation, and a log
+    of slow queries.
+
+>>> collector = LatencyCollector()
+>>> add_hook(collector)
+>>> add_hook(SlowQueryLog(0.1))
+>>> fetch_all(Student)
+>>> collector.stats()[('Student', 'SELECT')].count
+1
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from warnings import warn
+import logging
+import re
+import sqlite3 as sql
+import threading
+
+
+class QueryEvent(NamedTuple):
+    """
+    A statement run by datalite. Rows are the records
+        returned for statements returning records, such as
+        SELECT, otherwise the records changed.
+    """
+    sql: str
+    parameter_count: int
+    duration: float
+    rows: int
+    class_: Optional[type]
+    operation: str
+
+
+QueryHook = Callable[[QueryEvent], None]
+_hooks: List[QueryHook] = []
+_classes: Dict[Tuple[str, str], type] = {}
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+(\w+)", re.IGNORECASE)
+
+
+def add_hook(hook: QueryHook) -> None:
+    """
+    Register a hook, called with a QueryEvent after each
+    statement datalite runs, from the thread running it.
+
+    :param hook: A function taking a QueryEvent.
+    :return: None.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: QueryHook) -> None:
+    """
+    Unregister a hook.
+
+    :param hook: A registered hook.
+    :return: None.
+    """
+    _hooks.remove(hook)
+
+
+def _register_class(class_: type) -> None:
+    """
+    Register a datalite class, so that the statements
+    on its table are attributed to it.
+
+    :param class_: A datalite class.
+    :return: None.
+    """
+    _classes[(getattr(class_, 'db_path'), class_.__name__.lower())] = class_
+
+
+@lru_cache(maxsize=1024)
+def _describe(statement: str) -> Tuple[Optional[str], str]:
+    """
+    Get the table a statement is about, and its operation.
+
+    :param statement: The SQL statement.
+    :return: The name of the table, None if there is none,
+        and the first keyword of the statement, such as SELECT.
+    """
+    match = _TABLE_PATTERN.search(statement)
+    return match.group(1).lower() if match else None, statement.split(None, 1)[0].upper()
+
+
+def _emit(db_path: str, statement: str, parameter_count: int, duration: float, rows: int) -> None:
+    """
+    Call the hooks with the event of a statement, errors
+    raised by hooks are turned into warnings, so that they
+    do not interrupt the operation.
+
+    :param db_path: Path of the database of the statement.
+    :param statement: The SQL statement.
+    :param parameter_count: Number of parameters bound to it.
+    :param duration: Seconds spent running it.
+    :param rows: Number of records returned or changed.
+    :return: None.
+    """
+    table_name, operation = _describe(statement)
+    event = QueryEvent(statement, parameter_count, duration, rows, _classes.get((db_path, table_name)), operation)
+    for hook in tuple(_hooks):
+        try:
+            hook(event)
+        except Exception as error:
+            warn(f"Query hook {hook!r} raised {error!r}.", RuntimeWarning)
+
+
+class _InstrumentedCursor(sql.Cursor):
+    """
+    A cursor timing its statements, statements returning
+        records are timed until their records are exhausted,
+        or the cursor runs another statement or is closed.
+    """
+    _pending: Optional[List[Any]] = None  # Statement, parameter count, duration and rows so far.
+
+    def _finish(self) -> None:
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            _emit(self.connection.db_path, *pending)
+
+    def _fetched(self, start: float, rows: int, exhausted: bool) -> None:
+        pending = self._pending
+        if pending is not None:
+            pending[2] += perf_counter() - start
+            pending[3] += rows
+            if exhausted:
+                self._finish()
+
+    def execute(self, statement: str, parameters: Any = ()) -> '_InstrumentedCursor':
+        self._finish()
+        start = perf_counter()
+        super().execute(statement, parameters)
+        duration = perf_counter() - start
+        if self.description is None:
+            _emit(self.connection.db_path, statement, len(parameters), duration, max(self.rowcount, 0))
+        else:
+            self._pending = [statement, len(parameters), duration, 0]
+        return self
+
+    def executemany(self, statement: str, seq_of_parameters: Iterable[Any]) -> '_InstrumentedCursor':
+        self._finish()
+        parameter_count = [0]
+
+        def counted() -> Iterator[Any]:
+            for parameters in seq_of_parameters:
+                parameter_count[0] += len(parameters)
+                yield parameters
+        start = perf_counter()
+        super().executemany(statement, counted())
+        _emit(self.connection.db_path, statement, parameter_count[0], perf_counter() - start, max(self.rowcount, 0))
+        return self
+
+    def fetchone(self) -> Any:
+        start = perf_counter()
+        record = super().fetchone()
+        self._fetched(start, record is not None, record is None)
+        return record
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        size = self.arraysize if size is None else size
+        start = perf_counter()
+        records = super().fetchmany(size)
+        self._fetched(start, len(records), len(records) < size)
+        return records
+
+    def fetchall(self) -> List[Any]:
+        start = perf_counter()
+        records = super().fetchall()
+        self._fetched(start, len(records), True)
+        return records
+
+    def __next__(self) -> Any:
+        start = perf_counter()
+        try:
+            record = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return record
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self) -> None:
+        self._finish()
+
+
+class _InstrumentedConnection(sql.Connection):
+    """
+    A connection whose cursors time their statements,
+        while hooks are registered.
+    """
+
+    def __init__(self, db_path: str, *args: Any, **kwargs: Any) -> None:
+        super().__init__(db_path, *args, **kwargs)
+        self.db_path: str = db_path
+
+    def cursor(self, factory: Optional[type] = None) -> sql.Cursor:
+        if factory is None:
+            factory = _InstrumentedCursor if _hooks else sql.Cursor
+        return super().cursor(factory)
+
+    # The shortcuts of sqlite3.Connection run their statements without the execute methods of their cursor.
+    def execute(self, statement: str, parameters: Any = ()) -> sql.Cursor:
+        return self.cursor().execute(statement, parameters)
+
+    def executemany(self, statement: str, seq_of_parameters: Iterable[Any]) -> sql.Cursor:
+        return self.cursor().executemany(statement, seq_of_parameters)
+
+
+"""
+Upper bounds, in seconds, of the buckets of the latency
+    histograms of LatencyCollector, the last bucket holds
+    the durations above the last bound.
+"""
+LATENCY_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                                      0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyStats(NamedTuple):
+    """
+    Latency statistics of the statements of a class
+        and operation, durations are in seconds, buckets
+        are counts of statements per LATENCY_BUCKETS bound.
+    """
+    count: int
+    total: float
+    minimum: float
+    maximum: float
+    rows: int
+    buckets: Tuple[int, ...]
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean duration of the statements.
+        """
+        return self.total / self.count if self.count else 0.0
+
+
+class LatencyCollector:
+    """
+    A query hook aggregating latency histograms per class
+        and operation, statements on tables that are not of
+        a datalite class are aggregated under the class None.
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[Tuple[Optional[str], str], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: QueryEvent) -> None:
+        key = (event.class_.__name__ if event.class_ is not None else None, event.operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, event.duration, event.duration, 0,
+                                            [0] * (len(LATENCY_BUCKETS) + 1)]
+            stats[0] += 1
+            stats[1] += event.duration
+            stats[2] = min(stats[2], event.duration)
+            stats[3] = max(stats[3], event.duration)
+            stats[4] += event.rows
+            stats[5][bisect_left(LATENCY_BUCKETS, event.duration)] += 1
+
+    def stats(self) -> Dict[Tuple[Optional[str], str], LatencyStats]:
+        """
+        Get the latency statistics collected so far.
+
+        :return: A dictionary mapping class names and
+            operations to their latency statistics.
+        """
+        with self._lock:
+            return {key: LatencyStats(*stats[:5], tuple(stats[5])) for key, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        """
+        Discard the statistics collected so far.
+
+        :return: None.
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+class SlowQueryLog:
+    """
+    A query hook logging the statements that take at least
+        threshold seconds, as warnings of the datalite logger,
+        unless another logger is given.
+    """
+
+    def __init__(self, threshold: float, logger: Optional[logging.Logger] = None) -> None:
+        self.threshold: float = threshold
+        self.logger: logging.Logger = logger or logging.getLogger('datalite')
+
+    def __call__(self, event: QueryEvent) -> None:
+        if event.duration >= self.threshold:
+            self.logger.warning("Slow query (%.6f s, %d rows, %s): %s", event.duration, event.rows,
+                                event.class_.__name__ if event.class_ is not None else None, event.sql)
@@ -3,14 +3,20 @@ This module includes functions to insert multiple records
 to a bound database at one time, with one time open and closing
 of the database file.
 """
-from typing import TypeVar, Union, List, Tuple
-from dataclasses import asdict
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, TypeVar, List, Optional, Tuple, Iterable, Iterator, Union
 from warnings import warn
 from .constraints import ConstraintFailedError
-from .commons import _convert_sql_format, _create_table
+from .commons import _create_indexes, _create_table, _TableInfo
+from .connections import _connect
+from .cache import _get_cache, clear_cache
+from .fetch import _as_fields, _where
+from .query import Condition
 import sqlite3 as sql
 
 T = TypeVar('T')
+DEFAULT_CHUNK_SIZE: int = 1000
 
 
 class HeterogeneousCollectionError(Exception):
@@ -22,105 +28,368 @@ class HeterogeneousCollectionError(Exception):
     pass
 
 
-def _check_homogeneity(objects: Union[List[T], Tuple[T]]) -> None:
+def _homogeneous_chunks(objects: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
     """
-    Check if all of the members a Tuple or a List
-    is of the same type.
+    Split an iterable of objects into lists of chunk_size
+    objects, checking that all of them are of the same type
+    as the first one as they are consumed.
 
-    :param objects: Tuple or list to check.
-    :return: If all of the members of the same type.
+    :param objects: Objects to split.
+    :param chunk_size: Number of objects in each chunk.
+    :return: A generator of chunks.
     """
-    class_ = objects[0].__class__
-    if not all([isinstance(obj, class_) or isinstance(objects[0], obj.__class__)  for obj in objects]):
-        raise HeterogeneousCollectionError("Tuple or List is not homogeneous.")
+    iterator = iter(objects)
+    first = next(iterator, None)
+    if first is None:
+        return
+    class_ = first.__class__
+    chunk = [first]
+    for obj in iterator:
+        if not (isinstance(obj, class_) or isinstance(first, obj.__class__)):
+            raise HeterogeneousCollectionError("Tuple or List is not homogeneous.")
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
-def _toggle_memory_protection(cur: sql.Cursor, protect_memory: bool) -> None:
+@contextmanager
+def _toggle_memory_protection(cur: sql.Cursor, protect_memory: bool) -> Iterator[None]:
     """
     Given a cursor to an sqlite3 connection, if memory protection is false,
-        toggle memory protections off.
+        toggle memory protections off for the duration of the context,
+        since the connection may be pooled, they are restored afterwards.
 
     :param cur: Cursor to an open SQLite3 connection.
     :param protect_memory: Whether or not should memory be protected.
-    :return: Memory protections off.
+    :return: A context manager with memory protections off.
     """
-    if not protect_memory:
-        warn("Memory protections are turned off, "
-             "if operations are interrupted, file may get corrupt.", RuntimeWarning)
-        cur.execute("PRAGMA synchronous = OFF")
+    if protect_memory:
+        yield
+        return
+    warn("Memory protections are turned off, "
+         "if operations are interrupted, file may get corrupt.", RuntimeWarning)
+    synchronous = cur.execute("PRAGMA synchronous").fetchone()[0]
+    journal_mode = cur.execute("PRAGMA journal_mode").fetchone()[0]
+    cur.execute("PRAGMA synchronous = OFF")
+    if journal_mode != 'wal':  # Leaving WAL mode would block the other connections.
         cur.execute("PRAGMA journal_mode = MEMORY")
+    try:
+        yield
+        cur.connection.commit()  # Journal mode cannot be restored within a transaction.
+    except BaseException:
+        cur.connection.rollback()
+        raise
+    finally:
+        cur.execute(f"PRAGMA synchronous = {synchronous}")
+        cur.execute(f"PRAGMA journal_mode = {journal_mode}")
 
 
-def _mass_insert(objects: Union[List[T], Tuple[T]], db_name: str, protect_memory: bool = True) -> None:
+def _reserve_ids(cur: sql.Cursor, table_name: str, count: int) -> Optional[int]:
     """
-    Insert multiple records into an SQLite3 database.
+    Reserve a range of consecutive obj_ids in a table, by
+    advancing its AUTOINCREMENT sequence. The sequence is
+    written first, so the write lock is held until the end
+    of the transaction and no other connection can take
+    ids from the range.
 
-    :param objects: Objects to insert.
+    :param cur: Cursor to an open SQLite3 connection.
+    :param table_name: Name of the table.
+    :param count: Number of ids to reserve.
+    :return: The first id of the range, None if the table
+        was not created by datalite and has no sequence.
+    """
+    try:
+        cur.execute("UPDATE sqlite_sequence SET seq = seq + ? WHERE name = ?;", (count, table_name))
+    except sql.OperationalError:  # No table of the database has a sequence.
+        return None
+    if not cur.rowcount:  # Tables get a sequence on their first insertion.
+        schema = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;",
+                             (table_name, )).fetchone()
+        if schema is None or 'AUTOINCREMENT' not in schema[0].upper():
+            return None
+        cur.execute(f"INSERT INTO sqlite_sequence(name, seq) "
+                    f"SELECT ?, COALESCE(MAX(obj_id), 0) + ? FROM {table_name};", (table_name, count))
+    return cur.execute("SELECT seq FROM sqlite_sequence WHERE name = ?;", (table_name, )).fetchone()[0] - count + 1
+
+
+def _returned_id(cur: sql.Cursor) -> Optional[int]:
+    """
+    Get the obj_id returned by an executed upsert statement.
+
+    :param cur: Cursor that executed the statement.
+    :return: The obj_id, None if the record was ignored.
+    """
+    records = cur.fetchall()
+    return records[0][0] if records else None
+
+
+def _mass_insert(objects: Iterable[T], db_name: str, protect_memory: bool = True,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, commit_every: Optional[int] = None,
+                 on_conflict: Optional[str] = None, assign_ids: bool = True) -> None:
+    """
+    Insert multiple records into an SQLite3 database. As a
+    side-effect, this will set the obj_id attribute of the
+    objects to the unique ids of their entries.
+
+    :param objects: Objects to insert, any iterable of
+        objects of the same datalite class.
     :param db_name: Name of the database to insert.
     :param protect_memory: Whether or not memory
         protections are on or off.
+    :param chunk_size: Number of records inserted by
+        each executemany call.
+    :param commit_every: If given, commit after every
+        commit_every records, rounded up to a whole chunk,
+        otherwise commit once all records are inserted.
+    :param on_conflict: If given, how records conflicting with a
+        uniqueness constraint are resolved, see create_many.
+    :param assign_ids: If False, the objects are left unchanged,
+        as when they are copied to a database they are not bound to.
     :return: None
     """
-    _check_homogeneity(objects)
-    sql_queries = []
-    first_index: int = 0
-    table_name = objects[0].__class__.__name__.lower()
-
-    for i, obj in enumerate(objects):
-        kv_pairs = asdict(obj).items()
-        setattr(obj, "obj_id", first_index + i + 1)
-        sql_queries.append(f"INSERT INTO {table_name}(" +
-                           f"{', '.join(item[0] for item in kv_pairs)})" +
-                           f" VALUES ({', '.join(_convert_sql_format(item[1]) for item in kv_pairs)});")
-    with sql.connect(db_name) as con:
+    if commit_every:
+        chunk_size = min(chunk_size, commit_every)
+    uncommitted: int = 0
+    with _connect(db_name) as con:
         cur: sql.Cursor = con.cursor()
         try:
-            _toggle_memory_protection(cur, protect_memory)
-            cur.execute(f"SELECT obj_id FROM {table_name} ORDER BY obj_id DESC LIMIT 1")
-            index_tuple = cur.fetchone()
-            if index_tuple:
-                first_index = index_tuple[0]
-            cur.executescript("BEGIN TRANSACTION;\n" + '\n'.join(sql_queries) + '\nEND TRANSACTION;')
+            with _toggle_memory_protection(cur, protect_memory):
+                for chunk in _homogeneous_chunks(objects, chunk_size):
+                    table_info: _TableInfo = getattr(chunk[0], '_table_info')
+                    first_id = None
+                    if on_conflict is None or on_conflict == 'replace':
+                        first_id = _reserve_ids(cur, table_info.table_name, len(chunk))
+                    if first_id is not None:
+                        obj_ids = range(first_id, first_id + len(chunk))
+                        cur.executemany(table_info.insert_with_id_sql if on_conflict is None
+                                        else table_info.replace_with_id_sql,
+                                        [(obj_id, ) + table_info.values(obj) for obj_id, obj in zip(obj_ids, chunk)])
+                    elif on_conflict is None:
+                        cur.executemany(table_info.insert_sql, [table_info.values(obj) for obj in chunk])
+                        # The write lock is held by the transaction, so ids of a chunk are contiguous.
+                        last_id = cur.execute("SELECT last_insert_rowid();").fetchone()[0]
+                        obj_ids = range(last_id - len(chunk) + 1, last_id + 1)
+                    else:
+                        # Ignored and updated records break contiguity, so each id is returned.
+                        upsert_sql = table_info.upsert_sql(on_conflict)
+                        obj_ids = [_returned_id(cur.execute(upsert_sql, table_info.values(obj)))
+                                   for obj in chunk]
+                    if assign_ids:
+                        if on_conflict is not None and on_conflict != 'ignore':
+                            clear_cache(chunk[0].__class__)
+                        for obj_id, obj in zip(obj_ids, chunk):
+                            setattr(obj, "obj_id", obj_id)
+                            table_info.mark_clean(obj)
+                    uncommitted += len(chunk)
+                    if commit_every and uncommitted >= commit_every:
+                        con.commit()
+                        uncommitted = 0
         except sql.IntegrityError:
-            raise ConstraintFailedError
-    con.commit()
+            raise ConstraintFailedError("A constraint has failed.")
 
 
-def create_many(objects: Union[List[T], Tuple[T]], protect_memory: bool = True) -> None:
+def _peek(objects: Iterable[T]) -> Tuple[T, Iterable[T]]:
+    """
+    Get the first object of an iterable without
+    losing it, if the iterable is a generator.
+
+    :param objects: A non empty iterable.
+    :return: The first object and an iterable of all objects.
+    """
+    iterator = iter(objects)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        raise ValueError("Collection is empty.")
+    return first, chain((first, ), iterator)
+
+
+def create_many(objects: Iterable[T], protect_memory: bool = True, commit_every: Optional[int] = None,
+                on_conflict: Optional[str] = None) -> None:
     """
     Insert many records corresponding to objects
-    in a tuple or a list.
+    in an iterable, such as a tuple, a list or a
+    generator, generators are consumed lazily.
 
     :param protect_memory: If False, memory protections are turned off,
         makes it faster.
-    :param objects: A tuple or a list of objects decorated
+    :param objects: An iterable of objects decorated
         with datalite.
+    :param commit_every: If given, commit after every commit_every
+        records, so that records are persisted as an unbounded
+        generator is consumed.
+    :param on_conflict: If given, records conflicting with a uniqueness
+        constraint do not abort the insertion, "ignore" keeps the existing
+        records and sets the obj_id of their objects to None, "replace"
+        deletes them and inserts the new ones, "update" overwrites them
+        in place and sets the obj_id of their objects to their ids.
     :return: None.
     """
-    if objects:
-        _mass_insert(objects, getattr(objects[0], "db_path"), protect_memory)
-    else:
-        raise ValueError("Collection is empty.")
+    first, objects = _peek(objects)
+    _mass_insert(objects, getattr(first, "db_path"), protect_memory, commit_every=commit_every,
+                 on_conflict=on_conflict)
 
 
-def copy_many(objects: Union[List[T], Tuple[T]], db_name: str, protect_memory: bool = True) -> None:
+def copy_many(objects: Iterable[T], db_name: str, protect_memory: bool = True,
+              commit_every: Optional[int] = None, on_conflict: Optional[str] = None) -> None:
     """
     Copy many records to another database, from
     their original database to new database, do
-    not delete old records.
+    not delete old records. The objects keep their
+    obj_id and modified fields, which refer to their
+    original database.
 
-    :param objects: Objects to copy.
+    :param objects: Objects to copy, an iterable
+        such as a tuple, a list or a generator.
     :param db_name: Name of the new database.
     :param protect_memory: Wheter to protect memory during operation,
         Setting this to False will quicken the operation, but if the
         operation is cut short, database file will corrupt.
+    :param commit_every: If given, commit after every commit_every
+        records.
+    :param on_conflict: If given, how records conflicting with a
+        uniqueness constraint are resolved, see create_many.
     :return: None
     """
-    if objects:
-        with sql.connect(db_name) as con:
-            cur = con.cursor()
-            _create_table(objects[0].__class__, cur)
-            con.commit()
-        _mass_insert(objects, db_name, protect_memory)
-    else:
-        raise ValueError("Collection is empty.")
+    first, objects = _peek(objects)
+    with _connect(db_name) as con:
+        cur = con.cursor()
+        _create_table(first.__class__, cur)
+        _create_indexes(first.__class__, cur)
+    _mass_insert(objects, db_name, protect_memory, commit_every=commit_every, on_conflict=on_conflict,
+                 assign_ids=False)
+
+
+def _group_by_columns(table_info: _TableInfo, objects: List[T]) -> Dict[Tuple[str, ...], List[T]]:
+    """
+    Group objects by the columns modified in them, objects
+    without any modified columns are left out, all columns
+    are considered modified for objects whose changes are
+    not tracked.
+
+    :param table_info: Table info of the class of the objects.
+    :param objects: Objects to group.
+    :return: A dictionary mapping modified columns to objects.
+    """
+    groups: Dict[Tuple[str, ...], List[T]] = {}
+    for obj in objects:
+        columns = table_info.dirty_columns(obj)
+        if columns is None:
+            columns = table_info.columns
+        if columns:
+            groups.setdefault(columns, []).append(obj)
+    return groups
+
+
+def update_many(objects: Iterable[T], fields: Optional[Iterable[str]] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Update the records of many objects in a single
+    transaction, objects updated with the same columns
+    are written with a single executemany call.
+
+    :param objects: An iterable of objects of the same
+        datalite class.
+    :param fields: Fields to write, by default, the fields
+        modified since each object was last synchronised.
+    :param chunk_size: Number of objects updated at a time.
+    :return: None.
+    """
+    first, objects = _peek(objects)
+    class_ = first.__class__
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    if fields is not None:
+        fields = _as_fields(table_info, fields)
+        if not fields:
+            raise ValueError("No field to update is given.")
+    cache = _get_cache(class_)
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        try:
+            for chunk in _homogeneous_chunks(objects, chunk_size):
+                groups = _group_by_columns(table_info, chunk) if fields is None else {fields: chunk}
+                for columns, group in groups.items():
+                    cur.executemany(table_info.update_columns_sql(columns),
+                                    [tuple(getattr(obj, column) for column in columns) + (getattr(obj, 'obj_id'), )
+                                     for obj in group])
+                for obj in chunk:
+                    table_info.mark_clean(obj, fields)
+                    if cache is not None:
+                        cache.written(obj)
+        except sql.IntegrityError:
+            raise ConstraintFailedError("A constraint has failed.")
+
+
+def remove_many(class_: type, ids: Iterable[int]) -> None:
+    """
+    Remove the records with the given object ids in
+    a single transaction.
+
+    :param class_: Class of the records.
+    :param ids: Object ids of the records.
+    :return: None.
+    """
+    ids = list(ids)
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.executemany(getattr(class_, '_table_info').delete_sql, [(obj_id, ) for obj_id in ids])
+    cache = _get_cache(class_)
+    if cache is not None:
+        for obj_id in ids:
+            cache.invalidate(obj_id)
+
+
+def delete_where(class_: type, condition: Union[str, Condition]) -> int:
+    """
+    Remove the records that fit the given condition,
+    with a single statement.
+
+    :param class_: Class of the records.
+    :param condition: Condition to check for, either in SQL
+        syntax or as a query expression.
+    :return: Number of removed records.
+    """
+    if condition is None:
+        raise ValueError("No condition is given.")
+    where, parameters, tail = _where(condition)
+    if tail is not None:
+        raise ValueError("Removed records cannot be ordered or limited.")
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        cur.execute(f"DELETE FROM {getattr(class_, '_table_info').table_name}{where};", parameters)
+    clear_cache(class_)
+    return cur.rowcount
+
+
+def update_where(class_: type, values: Dict[str, Any], condition: Union[str, Condition]) -> int:
+    """
+    Set the given fields of the records that fit the
+    given condition, with a single statement.
+
+    :param class_: Class of the records.
+    :param values: A dictionary mapping fields to their new values.
+    :param condition: Condition to check for, either in SQL
+        syntax or as a query expression.
+    :return: Number of updated records.
+    """
+    table_info: _TableInfo = getattr(class_, '_table_info')
+    fields = _as_fields(table_info, values.keys())
+    if not fields:
+        raise ValueError("No field to update is given.")
+    if condition is None:
+        raise ValueError("No condition is given.")
+    where, parameters, tail = _where(condition)
+    if tail is not None:
+        raise ValueError("Updated records cannot be ordered or limited.")
+    with _connect(getattr(class_, 'db_path')) as con:
+        cur: sql.Cursor = con.cursor()
+        try:
+            cur.execute(f"UPDATE {table_info.table_name} SET {', '.join(field + ' = ?' for field in fields)}"
+                        f"{where};", tuple(values[field] for field in fields) + parameters)
+        except sql.IntegrityError:
+            raise ConstraintFailedError("A constraint has failed.")
+    clear_cache(class_)
+    return cur.rowcount
@@ -2,12 +2,16 @@
 Migrations module deals with migrating data when the object
 definitions change. This functions deal with Schema Migrations.
 """
-from dataclasses import Field
 from os.path import exists
-from typing import Dict, Tuple, List
+from time import monotonic
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Union
 import sqlite3 as sql
 
-from .commons import _create_table, _get_table_cols
+from .constraints import ConstraintFailedError
+from .commons import _column_definition, _create_indexes, _create_table, _index_name, _prepare_table_info
+from .connections import _connect
+from .cache import clear_cache
+from .instrumentation import _register_class
 
 
 def _get_db_table(class_: type) -> Tuple[str, str]:
@@ -24,7 +28,7 @@ def _get_db_table(class_: type) -> Tuple[str, str]:
     table_name: str = class_.__name__.lower()
     if not exists(database_name):
         raise FileNotFoundError(f"{database_name} does not exist")
-    with sql.connect(database_name) as con:
+    with _connect(database_name) as con:
         cur: sql.Cursor = con.cursor()
         cur.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?;", (table_name, ))
         count: int = int(cur.fetchone()[0])
@@ -33,37 +37,69 @@ def _get_db_table(class_: type) -> Tuple[str, str]:
     return database_name, table_name
 
 
-def _get_table_column_names(database_name: str, table_name: str) -> Tuple[str]:
+"""
+Definition of a column, as read from the database, its
+    declared type, if it is NOT NULL, its default value
+    and if it is UNIQUE.
+"""
+ColumnSchema = Tuple[str, bool, Optional[str], bool]
+Transform = Callable[[Any], Any]
+Transfer = Union[str, Tuple[str, Transform]]
+
+DEFAULT_MIGRATION_CHUNK_SIZE: int = 10000
+"""
+Name of the table recording the progress of chunked
+    migrations, one record per table being migrated.
+"""
+CHECKPOINT_TABLE: str = 'datalite_migrations'
+
+
+class MigrationProgress(NamedTuple):
+    """
+    Progress of a chunked migration.
     """
-    Get the column names of table.
+    copied: int
+    total: int
+    rows_per_second: float
 
-    :param database_name: Name of the database the table
-        resides in.
+
+def _table_schema(cur: sql.Cursor, table_name: str) -> Dict[str, ColumnSchema]:
+    """
+    Get the definitions of the columns of a table.
+
+    :param cur: Cursor in database.
     :param table_name: Name of the table.
-    :return: A tuple holding the column names of the table.
+    :return: A dictionary mapping the column names, except
+        obj_id, to their definitions.
     """
-    with sql.connect(database_name) as con:
-        cur: sql.Cursor = con.cursor()
-        cols: List[str] = _get_table_cols(cur, table_name)
-    return tuple(cols)
+    unique = set()
+    for index in cur.execute(f"PRAGMA index_list({table_name});").fetchall():
+        if index[2] and index[3] == 'u':  # Indexes created by UNIQUE column constraints.
+            index_columns = cur.execute(f"PRAGMA index_info({index[1]});").fetchall()
+            if len(index_columns) == 1:
+                unique.add(index_columns[0][2])
+    return {name: (type_.upper(), bool(not_null), default, name in unique)
+            for _, name, type_, not_null, default, _ in cur.execute(f"PRAGMA table_info({table_name});")
+            if name != 'obj_id'}
 
 
-def _copy_records(database_name: str, table_name: str):
+def _class_schema(class_: type) -> Dict[str, ColumnSchema]:
     """
-    Copy all records from a table.
+    Get the definitions of the columns of the table of a
+    class, as they would be read from the database, by
+    creating the table in a private in-memory database.
 
-    :param database_name: Name of the database.
-    :param table_name: Name of the table.
-    :return: A generator holding dataclass asdict representations.
+    :param class_: A datalite class.
+    :return: A dictionary mapping the column names, except
+        obj_id, to their definitions.
     """
-    with sql.connect(database_name) as con:
+    con = sql.connect(':memory:')
+    try:
         cur: sql.Cursor = con.cursor()
-        cur.execute(f'SELECT * FROM {table_name};')
-        values = cur.fetchall()
-        keys = _get_table_cols(cur, table_name)
-        keys.insert(0, 'obj_id')
-    records = (dict(zip(keys, value)) for value in values)
-    return records
+        _create_table(class_, cur, getattr(class_, 'types_table'))
+        return _table_schema(cur, class_.__name__.lower())
+    finally:
+        con.close()
 
 
 def _drop_table(database_name: str, table_name: str) -> None:
@@ -74,92 +110,271 @@ def _drop_table(database_name: str, table_name: str) -> None:
     :param table_name: Name of the table to be dropped.
     :return: None.
     """
-    with sql.connect(database_name) as con:
+    with _connect(database_name) as con:
         cur: sql.Cursor = con.cursor()
         cur.execute(f'DROP TABLE {table_name};')
-        con.commit()
-
-
-def _modify_records(data, col_to_del: Tuple[str], col_to_add: Tuple[str],
-                    flow: Dict[str, str]) -> Tuple[Dict[str, str]]:
-    """
-    Modify the asdict records in accordance
-        with schema migration rules provided.
-
-    :param data: Data kept as asdict in tuple.
-    :param col_to_del: Column names to delete.
-    :param col_to_add: Column names to add.
-    :param flow: A dictionary that explain
-        if the data from a deleted column
-        will be transferred to a column
-        to be added.
-    :return: The modified data records.
-    """
-    records = []
-    for record in data:
-        record_mod = {}
-        for key in record.keys():
-            if key in col_to_del and key in flow:
-                record_mod[flow[key]] = record[key]
-            elif key in col_to_del:
-                pass
-            else:
-                record_mod[key] = record[key]
-        for key_to_add in col_to_add:
-            if key_to_add not in record_mod:
-                record_mod[key_to_add] = None
-        records.append(record_mod)
-    return records
 
 
-def _migrate_records(class_: type, database_name: str, data,
-                     col_to_del: Tuple[str], col_to_add: Tuple[str], flow: Dict[str, str]) -> None:
+def _get_transfers(old: Dict[str, ColumnSchema], new: Dict[str, ColumnSchema],
+                   flow: Dict[str, Transfer]) -> Dict[str, Tuple[str, Optional[Transform]]]:
     """
-    Migrate the records into the modified table.
+    Get the column transfers that apply to a migration,
+    those from a column to be deleted to a column of the
+    new table, and those applying a transform function.
 
-    :param class_: Class of the entries.
-    :param database_name: Name of the database.
-    :param data: Data, asdict tuple.
-    :param col_to_del: Columns to be deleted.
-    :param col_to_add: Columns to be added.
-    :param flow: Flow dictionary stating where
-        column data will be transferred.
+    :param old: Columns of the table.
+    :param new: Columns of the migrated table.
+    :param flow: A dictionary that explain if the data
+        from a deleted column will be transferred to a
+        column to be added, either as the name of the column,
+        or as a tuple of the name of the column and a function
+        transforming the values.
+    :return: A dictionary mapping the columns of the
+        migrated table to the columns copied into them,
+        and the function transforming their values, if any.
+    """
+    transfers = {}
+    for source, target in flow.items():
+        target, transform = (target, None) if isinstance(target, str) else target
+        if source in old and target in new and (source not in new or transform is not None):
+            transfers[target] = (source, transform)
+    return transfers
+
+
+def _alter_table(class_: type, cur: sql.Cursor, table_name: str, old: Dict[str, ColumnSchema],
+                 new: Dict[str, ColumnSchema], transfers: Dict[str, Tuple[str, Optional[Transform]]]) -> bool:
+    """
+    Migrate a table in place, by renaming, dropping and
+    adding its columns, this is possible if the columns
+    kept or transferred are unchanged, values are not
+    transformed, and columns added are neither UNIQUE
+    nor NOT NULL without a default. Indexes no longer
+    declared by the class are dropped, as they would be
+    by rebuilding the table.
+
+    :param class_: Datalite class to migrate.
+    :param cur: Cursor in database, within a transaction.
+    :param table_name: Name of the table.
+    :param old: Columns of the table.
+    :param new: Columns of the migrated table.
+    :param transfers: Column transfers, see _get_transfers.
+    :return: True if the table was migrated, False if it
+        must be rebuilt instead.
+    """
+    if any(target in old or old[source] != new[target] or transform is not None
+           for target, (source, transform) in transfers.items()):
+        return False
+    if any(old[column] != new[column] for column in old if column in new):
+        return False
+    added = [column for column in sorted(new) if column not in old and column not in transfers]
+    if any(new[column][3] or (new[column][1] and new[column][2] is None) for column in added):
+        return False
+    sources = {source for source, _ in transfers.values()}
+    dropped = [column for column in old if column not in new and column not in sources]
+    fields = class_.__dataclass_fields__
+    declared = {_index_name(table_name, index) for index in getattr(class_, '_indexes', ())}
+    cur.execute(f"PRAGMA index_list({table_name});")
+    undeclared = [row[1] for row in cur.fetchall() if row[3] == 'c' and row[1] not in declared]
+    cur.execute("SAVEPOINT datalite_alter;")
+    try:
+        for index_name in undeclared:
+            cur.execute(f"DROP INDEX {index_name};")
+        for target, (source, _) in transfers.items():
+            cur.execute(f"ALTER TABLE {table_name} RENAME COLUMN {source} TO {target};")
+        for column in dropped:
+            cur.execute(f"ALTER TABLE {table_name} DROP COLUMN {column};")
+        for column in added:
+            cur.execute(f"ALTER TABLE {table_name} ADD COLUMN "
+                        f"{_column_definition(fields[column], getattr(class_, 'types_table'))};")
+    except sql.OperationalError:  # Such as dropping an indexed column, or an old SQLite version.
+        cur.execute("ROLLBACK TO datalite_alter;")
+        cur.execute("RELEASE datalite_alter;")
+        return False
+    cur.execute("RELEASE datalite_alter;")
+    return True
+
+
+def _copy_sql(cur: sql.Cursor, table_name: str, old: Dict[str, ColumnSchema], new: Dict[str, ColumnSchema],
+              transfers: Dict[str, Tuple[str, Optional[Transform]]]) -> str:
+    """
+    Get the statement copying the records of a table into
+    its migrated table, transform functions are registered
+    to the connection as SQL functions, so that records are
+    copied within the database.
+
+    :param cur: Cursor in database.
+    :param table_name: Name of the table.
+    :param old: Columns of the table.
+    :param new: Columns of the migrated table.
+    :param transfers: Column transfers, see _get_transfers.
+    :return: The statement, without a WHERE clause.
+    """
+    columns = [column for column in sorted(new) if column in old or column in transfers]
+    sources = []
+    for column in columns:
+        source, transform = transfers.get(column, (column, None))
+        if transform is not None:
+            cur.connection.create_function(f"datalite_transform_{column}", 1, transform)
+            source = f"datalite_transform_{column}({source})"
+        sources.append(source)
+    return f"INSERT INTO {table_name}_migration({', '.join(['obj_id'] + columns)}) " \
+           f"SELECT {', '.join(['obj_id'] + sources)} FROM {table_name}"
+
+
+def _replace_table(cur: sql.Cursor, table_name: str) -> None:
+    """
+    Replace a table with its migrated table, keeping
+    its AUTOINCREMENT sequence.
+
+    :param cur: Cursor in database, within a transaction.
+    :param table_name: Name of the table.
     :return: None.
     """
-    with sql.connect(database_name) as con:
-        cur: sql.Cursor = con.cursor()
-        _create_table(class_, cur, getattr(class_, 'types_table'))
-        con.commit()
-    new_records = _modify_records(data, col_to_del, col_to_add, flow)
-    for record in new_records:
-        del record['obj_id']
-        keys_to_delete = [key for key in record if record[key] is None]
-        for key in keys_to_delete:
-            del record[key]
-        class_(**record).create_entry()
+    sequence = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = ?;", (table_name, )).fetchone()
+    cur.execute(f"DROP TABLE {table_name};")
+    cur.execute(f"ALTER TABLE {table_name}_migration RENAME TO {table_name};")
+    if sequence is not None:  # Ids of removed records are not reused.
+        cur.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?;", (sequence[0], table_name))
+        if not cur.rowcount:
+            cur.execute("INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?);", (table_name, sequence[0]))
+
+
+def _begin(con: sql.Connection) -> None:
+    """
+    Begin a transaction, if none is in progress, since
+    schema changes are not within a transaction otherwise.
+
+    :param con: Connection to the database.
+    :return: None.
+    """
+    if not con.in_transaction:
+        con.execute("BEGIN IMMEDIATE;")
+
+
+def _prepare_migration(class_: type) -> Tuple[str, str, Dict[str, ColumnSchema]]:
+    """
+    Prepare a class for the migration of its table.
+
+    :param class_: Datalite class to migrate.
+    :return: Database and table names, and the columns
+        of the migrated table.
+    """
+    database_name, table_name = _get_db_table(class_)
+    _prepare_table_info(class_)  # The class definition may have changed since it was decorated.
+    clear_cache(class_)
+    _register_class(class_)
+    return database_name, table_name, _class_schema(class_)
 
 
-def basic_migrate(class_: type, column_transfer: dict = None) -> None:
+def basic_migrate(class_: type, column_transfer: Optional[Dict[str, Transfer]] = None) -> None:
     """
     Given a class, compare its previous table,
     delete the fields that no longer exist,
     create new columns for new fields. If the
     column_flow parameter is given, migrate elements
-    from previous column to the new ones. It should be
-    noted that, the obj_ids do not persist.
+    from previous column to the new ones. The
+    migration runs in a single transaction, in place
+    using ALTER TABLE where possible, otherwise by
+    copying the records to a new table within the
+    database, in both cases obj_ids persist.
 
     :param class_: Datalite class to migrate.
     :param column_transfer: A dictionary showing which
-        columns will be copied to new ones.
+        columns will be copied to new ones, values are
+        either the name of the new column, or a tuple of
+        the name and a function applied to each value.
     :return: None.
     """
-    database_name, table_name = _get_db_table(class_)
-    table_column_names: Tuple[str] = _get_table_column_names(database_name, table_name)
-    values = class_.__dataclass_fields__.values()
-    data_fields: Tuple[Field] = tuple(field for field in values)
-    data_field_names: Tuple[str] = tuple(field.name for field in data_fields)
-    columns_to_be_deleted: Tuple[str] = tuple(column for column in table_column_names if column not in data_field_names)
-    columns_to_be_added: Tuple[str] = tuple(column for column in data_field_names if column not in table_column_names)
-    records = _copy_records(database_name, table_name)
-    _drop_table(database_name, table_name)
-    _migrate_records(class_, database_name, records, columns_to_be_deleted, columns_to_be_added, column_transfer)
+    database_name, table_name, new = _prepare_migration(class_)
+    with _connect(database_name) as con:
+        cur: sql.Cursor = con.cursor()
+        _begin(con)
+        old = _table_schema(cur, table_name)
+        transfers = _get_transfers(old, new, column_transfer or {})
+        if not _alter_table(class_, cur, table_name, old, new, transfers):
+            _create_table(class_, cur, getattr(class_, 'types_table'), f"{table_name}_migration")
+            try:
+                cur.execute(_copy_sql(cur, table_name, old, new, transfers) + ";")
+            except sql.IntegrityError:
+                raise ConstraintFailedError("A constraint has failed.")
+            _replace_table(cur, table_name)
+        _create_indexes(class_, cur)
+
+
+def chunked_migrate(class_: type, column_transfer: Optional[Dict[str, Transfer]] = None,
+                    chunk_size: int = DEFAULT_MIGRATION_CHUNK_SIZE,
+                    progress: Optional[Callable[[MigrationProgress], None]] = None) -> None:
+    """
+    Migrate the table of a class like basic_migrate, but if
+    the table cannot be altered in place, copy its records
+    in chunks of consecutive obj_ids, each chunk in its own
+    transaction. Copied chunks are recorded in a checkpoint
+    table, so that if the migration is interrupted, calling
+    this function again resumes it from the last chunk copied.
+    Records modified during the migration, other than those
+    inserted, may not be migrated, so writes to the table
+    should be stopped beforehand.
+
+    :param class_: Datalite class to migrate.
+    :param column_transfer: A dictionary showing which
+        columns will be copied to new ones, see basic_migrate.
+    :param chunk_size: Number of records copied in each chunk.
+    :param progress: If given, a function called after each
+        chunk with the progress of the migration.
+    :return: None.
+    """
+    database_name, table_name, new = _prepare_migration(class_)
+    with _connect(database_name) as con:
+        cur: sql.Cursor = con.cursor()
+        _begin(con)
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} "
+                    f"(table_name TEXT PRIMARY KEY, last_id INTEGER NOT NULL, copied INTEGER NOT NULL);")
+        old = _table_schema(cur, table_name)
+        transfers = _get_transfers(old, new, column_transfer or {})
+        checkpoint = cur.execute(f"SELECT last_id, copied FROM {CHECKPOINT_TABLE} WHERE table_name = ?;",
+                                 (table_name, )).fetchone()
+        if checkpoint is None:
+            if _alter_table(class_, cur, table_name, old, new, transfers):
+                _create_indexes(class_, cur)
+                return
+            _create_table(class_, cur, getattr(class_, 'types_table'), f"{table_name}_migration")
+            cur.execute(f"INSERT INTO {CHECKPOINT_TABLE}(table_name, last_id, copied) VALUES (?, 0, 0);",
+                        (table_name, ))
+            checkpoint = (0, 0)
+    last_id, copied = checkpoint
+    with _connect(database_name) as con:
+        total = copied + con.execute(f"SELECT count(*) FROM {table_name} WHERE obj_id > ?;",
+                                     (last_id, )).fetchone()[0]
+    start, copied_now = monotonic(), 0
+    while True:
+        with _connect(database_name) as con:
+            cur = con.cursor()
+            bound = cur.execute(f"SELECT obj_id FROM {table_name} WHERE obj_id > ? ORDER BY obj_id LIMIT 1 OFFSET ?;",
+                                (last_id, chunk_size - 1)).fetchone()
+            copy_sql = _copy_sql(cur, table_name, old, new, transfers)
+            try:
+                if bound is not None:
+                    cur.execute(f"{copy_sql} WHERE obj_id > ? AND obj_id <= ?;", (last_id, bound[0]))
+                else:
+                    cur.execute(f"{copy_sql} WHERE obj_id > ?;", (last_id, ))
+            except sql.IntegrityError:
+                raise ConstraintFailedError("A constraint has failed.")
+            copied, copied_now = copied + cur.rowcount, copied_now + cur.rowcount
+            if bound is not None:
+                last_id = bound[0]
+            else:
+                last_id = cur.execute(f"SELECT COALESCE(MAX(obj_id), ?) FROM {table_name}_migration;",
+                                      (last_id, )).fetchone()[0]
+            cur.execute(f"UPDATE {CHECKPOINT_TABLE} SET last_id = ?, copied = ? WHERE table_name = ?;",
+                        (last_id, copied, table_name))
+        if progress is not None:
+            elapsed = monotonic() - start
+            progress(MigrationProgress(copied, max(total, copied), copied_now / elapsed if elapsed else 0.0))
+        if bound is None:
+            break
+    with _connect(database_name) as con:
+        cur = con.cursor()
+        _begin(con)
+        _replace_table(cur, table_name)
+        _create_indexes(class_, cur)
+        cur.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE table_name = ?;", (table_name, ))
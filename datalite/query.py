@@ -0,0 +1,243 @@
+"""
+datalite.query module introduces query expressions, an
+    alternative to writing conditions in SQL syntax. Expressions
+    compile to parameterised SQL, so values are never inlined
+    into the statement, which keeps statements reusable and
+    safe against injection.
+
+>>> condition = (Field('student_gpa') > 3.5) & Field('student_name').like('A%')
+>>> fetch_if(Student, condition.order_by(Field('student_gpa').desc()).limit(10))
+"""
+from typing import Any, Iterable, Optional, Tuple, Union
+
+
+def _check_name(name: str) -> str:
+    """
+    Check that a field name is a valid identifier.
+
+    :param name: Name of the field.
+    :return: The name.
+    """
+    if not name.isidentifier():
+        raise ValueError(f"{name} is not a valid field name.")
+    return name
+
+
+class Condition:
+    """
+    A condition over the fields of a datalite class, made
+        by comparing fields, conditions can be combined with
+        & (AND), | (OR) and negated with ~ (NOT).
+    """
+
+    def __init__(self, sql: str, parameters: Tuple[Any, ...] = ()) -> None:
+        self.sql: str = sql
+        self.parameters: Tuple[Any, ...] = parameters
+
+    def __and__(self, other: 'Condition') -> 'Condition':
+        return Condition(f"({self.sql}) AND ({other.sql})", self.parameters + other.parameters)
+
+    def __or__(self, other: 'Condition') -> 'Condition':
+        return Condition(f"({self.sql}) OR ({other.sql})", self.parameters + other.parameters)
+
+    def __invert__(self) -> 'Condition':
+        return Condition(f"NOT ({self.sql})", self.parameters)
+
+    def __repr__(self) -> str:
+        return f"Condition({self.sql!r}, {self.parameters!r})"
+
+    def order_by(self, *fields: Union[str, 'Field', 'Ordering']) -> 'Query':
+        """
+        Order the records fitting the condition.
+
+        :param fields: Fields to order by, in ascending order unless
+            given as Field(...).desc().
+        :return: A query.
+        """
+        return Query(self).order_by(*fields)
+
+    def limit(self, count: int, offset: int = 0) -> 'Query':
+        """
+        Limit the number of records fitting the condition.
+
+        :param count: Maximum number of records.
+        :param offset: Number of records to skip.
+        :return: A query.
+        """
+        return Query(self).limit(count, offset)
+
+
+class Ordering:
+    """
+    A field and a direction to order records by.
+    """
+
+    def __init__(self, name: str, descending: bool = False) -> None:
+        self.name: str = _check_name(name)
+        self.descending: bool = descending
+
+    @property
+    def sql(self) -> str:
+        """
+        ORDER BY term of the ordering.
+        """
+        return f"{self.name} {'DESC' if self.descending else 'ASC'}"
+
+
+class Field:
+    """
+    A field of a datalite class, comparing it to a value
+        creates a Condition.
+    """
+    __hash__ = None
+
+    def __init__(self, name: str) -> None:
+        self.name: str = _check_name(name)
+
+    def _compare(self, operator: str, value: Any) -> Condition:
+        return Condition(f"{self.name} {operator} ?", (value, ))
+
+    def __eq__(self, value: Any) -> Condition:
+        return self.is_null() if value is None else self._compare('=', value)
+
+    def __ne__(self, value: Any) -> Condition:
+        return ~self.is_null() if value is None else self._compare('!=', value)
+
+    def __lt__(self, value: Any) -> Condition:
+        return self._compare('<', value)
+
+    def __le__(self, value: Any) -> Condition:
+        return self._compare('<=', value)
+
+    def __gt__(self, value: Any) -> Condition:
+        return self._compare('>', value)
+
+    def __ge__(self, value: Any) -> Condition:
+        return self._compare('>=', value)
+
+    def in_(self, values: Iterable[Any]) -> Condition:
+        """
+        Check if the field is one of the values.
+
+        :param values: Values to check for.
+        :return: The condition.
+        """
+        values = tuple(values)
+        if not values:
+            return Condition("0")
+        return Condition(f"{self.name} IN ({', '.join('?' for _ in values)})", values)
+
+    def between(self, low: Any, high: Any) -> Condition:
+        """
+        Check if the field is between two values, inclusive.
+
+        :param low: Lower bound.
+        :param high: Upper bound.
+        :return: The condition.
+        """
+        return Condition(f"{self.name} BETWEEN ? AND ?", (low, high))
+
+    def like(self, pattern: str) -> Condition:
+        """
+        Check if the field matches an SQL LIKE pattern.
+
+        :param pattern: The pattern.
+        :return: The condition.
+        """
+        return self._compare('LIKE', pattern)
+
+    def is_null(self) -> Condition:
+        """
+        Check if the field is NULL.
+
+        :return: The condition.
+        """
+        return Condition(f"{self.name} IS NULL")
+
+    def asc(self) -> Ordering:
+        """
+        Order by the field in ascending order.
+
+        :return: The ordering.
+        """
+        return Ordering(self.name)
+
+    def desc(self) -> Ordering:
+        """
+        Order by the field in descending order.
+
+        :return: The ordering.
+        """
+        return Ordering(self.name, True)
+
+
+class Query:
+    """
+    A condition with an order and a limit. Without an
+        order, records are ordered by their obj_id.
+    """
+
+    def __init__(self, condition: Optional[Condition] = None) -> None:
+        self.condition: Optional[Condition] = condition
+        self.ordering: Tuple[Ordering, ...] = ()
+        self.count: Optional[int] = None
+        self.offset: int = 0
+
+    def _copy(self) -> 'Query':
+        query = Query(self.condition)
+        query.ordering, query.count, query.offset = self.ordering, self.count, self.offset
+        return query
+
+    def order_by(self, *fields: Union[str, Field, Ordering]) -> 'Query':
+        """
+        Order the records fitting the query.
+
+        :param fields: Fields to order by, in ascending order unless
+            given as Field(...).desc().
+        :return: A new query.
+        """
+        query = self._copy()
+        query.ordering += tuple(field if isinstance(field, Ordering) else
+                                Ordering(field.name if isinstance(field, Field) else field) for field in fields)
+        return query
+
+    def limit(self, count: int, offset: int = 0) -> 'Query':
+        """
+        Limit the number of records fitting the query.
+
+        :param count: Maximum number of records.
+        :param offset: Number of records to skip.
+        :return: A new query.
+        """
+        query = self._copy()
+        query.count, query.offset = count, offset
+        return query
+
+    @property
+    def tail_sql(self) -> str:
+        """
+        ORDER BY and LIMIT clauses of the query.
+        """
+        ordering = ', '.join(order.sql for order in self.ordering) or 'obj_id'
+        limit = f" LIMIT {int(self.count)} OFFSET {int(self.offset)}" if self.count is not None else ""
+        return f" ORDER BY {ordering}{limit}"
+
+
+def _compile_condition(condition: Union[str, Condition, Query]) -> Tuple[str, Tuple[Any, ...], Optional[str]]:
+    """
+    Compile a condition, given either in SQL syntax or
+    as a query expression.
+
+    :param condition: The condition.
+    :return: The WHERE clause, its parameters, and the ORDER BY
+        and LIMIT clauses if the condition is a Query, otherwise None.
+    """
+    if isinstance(condition, str):
+        return condition, (), None
+    if isinstance(condition, Condition):
+        return condition.sql, condition.parameters, None
+    if isinstance(condition, Query):
+        if condition.condition is None:
+            return "1", (), condition.tail_sql
+        return condition.condition.sql, condition.condition.parameters, condition.tail_sql
+    raise TypeError(f"{condition!r} is not a condition.")
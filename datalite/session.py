@@ -0,0 +1,127 @@
+"""
+datalite.session module introduces sessions, units of work
+    that track new, modified and removed datalite objects
+    and write them to their databases at once, in a single
+    transaction per database.
+"""
+from contextlib import ExitStack
+from typing import Any, Dict, List
+
+from .connections import _connect
+from .mass_actions import _mass_insert, remove_many, update_many
+
+
+def _group_by_class(objects: List[Any]) -> Dict[type, List[Any]]:
+    """
+    Group objects by their class, preserving their order.
+
+    :param objects: Objects to group.
+    :return: A dictionary mapping classes to their objects.
+    """
+    groups: Dict[type, List[Any]] = {}
+    for obj in objects:
+        groups.setdefault(obj.__class__, []).append(obj)
+    return groups
+
+
+class Session:
+    """
+    A unit of work over datalite objects. Objects registered
+        to the session are written when the session is flushed,
+        or when its context exits without an exception, records
+        of the same class and operation are written together, using
+        the functions of datalite.mass_actions.
+
+    >>> with Session() as session:
+    ...     session.add(Student(1, "Kurt Gödel"))
+    ...     session.remove(fetch_from(Student, 2))
+    """
+
+    def __init__(self) -> None:
+        self._new: Dict[int, Any] = {}
+        self._dirty: Dict[int, Any] = {}
+        self._deleted: Dict[int, Any] = {}
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.clear()
+
+    def add(self, obj: Any) -> None:
+        """
+        Register a new object, its entry is created
+        when the session is flushed.
+
+        :param obj: Instance of a datalite class.
+        :return: None.
+        """
+        self._new[id(obj)] = obj
+
+    def update(self, obj: Any) -> None:
+        """
+        Register a modified object, its entry is updated
+        when the session is flushed.
+
+        :param obj: Instance of a datalite class.
+        :return: None.
+        """
+        if id(obj) not in self._new:
+            self._dirty[id(obj)] = obj
+
+    def remove(self, obj: Any) -> None:
+        """
+        Register an object to be removed, its entry is
+        removed when the session is flushed.
+
+        :param obj: Instance of a datalite class.
+        :return: None.
+        """
+        if id(obj) in self._new:
+            del self._new[id(obj)]
+            return
+        self._dirty.pop(id(obj), None)
+        self._deleted[id(obj)] = obj
+
+    def clear(self) -> None:
+        """
+        Discard all the pending changes.
+
+        :return: None.
+        """
+        self._new, self._dirty, self._deleted = {}, {}, {}
+
+    def flush(self) -> None:
+        """
+        Write the pending changes to their databases,
+        in one transaction per database, if any of them
+        fails, the obj_id and the modified fields of the
+        objects are restored.
+
+        :return: None.
+        """
+        new = _group_by_class(list(self._new.values()))
+        dirty = _group_by_class(list(self._dirty.values()))
+        deleted = _group_by_class(list(self._deleted.values()))
+        db_paths = {getattr(class_, 'db_path') for class_ in (*new, *dirty, *deleted)}
+        # Objects are updated as they are written, they are restored if the transactions are rolled back.
+        states = [(obj, getattr(obj, '_table_info').sync_state(obj))
+                  for objects in (*new.values(), *dirty.values()) for obj in objects]
+        try:
+            with ExitStack() as stack:
+                for db_path in db_paths:
+                    stack.enter_context(_connect(db_path))
+                for class_, objects in new.items():
+                    _mass_insert(objects, getattr(class_, 'db_path'))
+                for class_, objects in dirty.items():
+                    update_many(objects)
+                for class_, objects in deleted.items():
+                    remove_many(class_, [getattr(obj, 'obj_id') for obj in objects])
+        except BaseException:
+            for obj, state in states:
+                getattr(obj, '_table_info').restore_sync_state(obj, state)
+            raise
+        self.clear()
@@ -1,12 +1,27 @@
 import unittest
 from datalite import datalite
-from datalite.constraints import Unique, ConstraintFailedError
-from datalite.fetch import fetch_if, fetch_all, fetch_range, fetch_from, fetch_equals, fetch_where
-from datalite.mass_actions import create_many, copy_many
-from sqlite3 import connect
-from dataclasses import dataclass, asdict
+from datalite.datalite_decorator import remove_from
+from datalite.constraints import Unique, ConstraintFailedError, Indexed, Index
+from datalite.fetch import fetch_if, fetch_all, fetch_range, fetch_from, fetch_equals, fetch_where, \
+    iter_all, iter_if, iter_where, seek_all, seek_if, seek_where, fetch_many_ids, fetch_count, fetch_exists, \
+    fetch_columns, aggregate, is_fetchable
+from datalite.mass_actions import create_many, copy_many, _mass_insert, update_many, remove_many, delete_where, \
+    update_where
+from sqlite3 import connect, OperationalError
+from dataclasses import dataclass, asdict, field, make_dataclass
 from math import floor
-from datalite.migrations import basic_migrate, _drop_table
+from datalite.migrations import basic_migrate, chunked_migrate, _drop_table
+from datalite.connections import get_pool, close_all, _connect, register_pool
+from datalite.session import Session
+from datalite.cache import ObjectCache, cache_info, clear_cache
+from datalite.query import Field, Query
+from datalite.aio import acreate_many, afetch_all, afetch_count, afetch_from, afetch_where, aiter_where, \
+    aremove_many, close_executors, _get_executor
+from datalite.instrumentation import add_hook, remove_hook, LatencyCollector, SlowQueryLog
+from threading import Thread
+from tempfile import mkdtemp
+from shutil import rmtree
+import asyncio
 
 
 @datalite(db_path='test.db')
@@ -57,6 +72,71 @@ class MassCommit:
     str_: str
 
 
+@datalite(db_path='test.db', cache_size=2)
+@dataclass
+class CachedClass:
+    str_: str
+
+
+@datalite(db_path='test.db', indexes=[Index('first', 'second'),
+                                      Index('second', where='second > 0', unique=True, name='positive_second')])
+@dataclass
+class IndexedClass:
+    email: Indexed[str]
+    first: int = 0
+    second: int = 0
+
+
+@datalite(db_path='test.db')
+@dataclass
+class UpsertClass:
+    key: Unique[str]
+    value: int = 0
+
+    def __eq__(self, other):
+        return asdict(self) == asdict(other)
+
+
+@datalite(db_path='test.db')
+@dataclass
+class DirtyClass:
+    integer_value: int
+    float_value: float
+    str_value: str
+
+
+@datalite(db_path='test.db')
+@dataclass
+class BytesClass:
+    bytes_: bytes
+
+
+@datalite(db_path='test.db')
+@dataclass
+class HydratedClass:
+    number: int = 0
+    blob: bytes = b''
+
+    def __post_init__(self):
+        HydratedClass.initialised += 1
+
+
+HydratedClass.initialised = 0
+
+
+@datalite(db_path='test.db')
+@dataclass
+class SlottedClass:
+    __slots__ = ('number', 'obj_id')
+    number: int
+
+
+@datalite(db_path='unpooled.db', pooled=False)
+@dataclass
+class UnpooledClass:
+    number: int = 0
+
+
 def getValFromDB(obj_id = 1):
     with connect('test.db') as db:
         cur = db.cursor()
@@ -99,6 +179,33 @@ class DatabaseMain(unittest.TestCase):
         self.assertEqual(len(objects), init_len)
 
 
+class DatabaseDirtyTracking(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_object = DirtyClass(12, 0.4, 'TestValue')
+        self.test_object.create_entry()
+
+    def testOnlyChangedColumnsWritten(self):
+        self.test_object.integer_value = 41
+        with connect('test.db') as db:
+            db.execute('UPDATE dirtyclass SET str_value = "changed" WHERE obj_id = ?', (self.test_object.obj_id, ))
+        self.test_object.update_entry()
+        with connect('test.db') as db:
+            from_db = db.execute('SELECT integer_value, str_value FROM dirtyclass WHERE obj_id = ?',
+                                 (self.test_object.obj_id, )).fetchone()
+        self.assertEqual((41, "changed"), from_db)
+
+    def testNoChangesSkipped(self):
+        fetched = fetch_from(DirtyClass, self.test_object.obj_id)
+        self.assertEqual((), DirtyClass._table_info.dirty_columns(fetched))
+        fetched.float_value = 2.5
+        self.assertEqual(('float_value', ), DirtyClass._table_info.dirty_columns(fetched))
+        fetched.update_entry()
+        self.assertEqual((), DirtyClass._table_info.dirty_columns(fetched))
+
+    def tearDown(self) -> None:
+        self.test_object.remove_entry()
+
+
 class DatabaseFetchCalls(unittest.TestCase):
     def setUp(self) -> None:
         self.objs = [FetchClass(1, 'a'), FetchClass(2, 'b'), FetchClass(3, 'b')]
@@ -128,6 +235,15 @@ class DatabaseFetchCalls(unittest.TestCase):
         t_objs = fetch_range(FetchClass, range(self.objs[0].obj_id, self.objs[2].obj_id))
         self.assertEqual(tuple(self.objs[0:2]), t_objs)
 
+    def testFetchRangeStep(self):
+        t_objs = fetch_range(FetchClass, range(self.objs[0].obj_id, self.objs[2].obj_id + 1, 2))
+        self.assertEqual((self.objs[0], self.objs[2]), t_objs)
+
+    def testFetchManyIds(self):
+        ids = [self.objs[2].obj_id, -1, self.objs[0].obj_id]
+        self.assertEqual((self.objs[2], self.objs[0]), fetch_many_ids(FetchClass, ids))
+        self.assertEqual((self.objs[1], ), fetch_many_ids(FetchClass, [*range(-2000, 0), self.objs[1].obj_id]))
+
     def tearDown(self) -> None:
         [obj.remove_entry() for obj in self.objs]
 
@@ -149,6 +265,120 @@ class DatabaseFetchPaginationCalls(unittest.TestCase):
         t_objs = fetch_if(FetchClass, 'str_ = "0"', 1, 5)
         self.assertEqual(tuple(self.objs[:5]), t_objs)
 
+    def testSeekAll(self):
+        start = len(fetch_all(FetchClass)) - len(self.objs)
+        pages, continuation = [], None
+        while True:
+            page, continuation = seek_all(FetchClass, continuation, 10)
+            pages.append(page)
+            if continuation is None:
+                break
+        self.assertEqual(tuple(self.objs), sum(pages, ())[start:])
+
+    def testSeekWhere(self):
+        first, continuation = seek_where(FetchClass, 'str_', '0', None, 6)
+        second, last = seek_where(FetchClass, 'str_', '0', continuation, 6)
+        self.assertEqual(tuple(self.objs[:10]), first + second)
+        self.assertIsNone(last)
+
+    def testSeekIf(self):
+        page, _ = seek_if(FetchClass, 'str_ = "1" OR str_ = "2"', None, 15)
+        self.assertEqual(tuple(self.objs[10:25]), page)
+
+    def testSeekInvalidContinuation(self):
+        _, continuation = seek_all(FetchClass, None, 1)
+        self.assertRaises(ValueError, lambda: seek_all(TestClass, continuation))
+        self.assertRaises(ValueError, lambda: seek_all(FetchClass, 'not a token'))
+
+    def tearDown(self) -> None:
+        [obj.remove_entry() for obj in self.objs]
+
+
+class DatabaseQueryExpressions(unittest.TestCase):
+    def setUp(self) -> None:
+        self.objs = [FetchClass(i, f'{floor(i/10)}') for i in range(30)]
+        [obj.create_entry() for obj in self.objs]
+
+    def testCompile(self):
+        condition = (Field('ordinal') > 3) & (Field('str_').in_(['a', 'b']) | ~(Field('str_') == None))
+        self.assertEqual('(ordinal > ?) AND ((str_ IN (?, ?)) OR (NOT (str_ IS NULL)))', condition.sql)
+        self.assertEqual((3, 'a', 'b'), condition.parameters)
+        self.assertRaises(ValueError, lambda: Field('str_; DROP TABLE fetchclass'))
+
+    def testFetchIfCondition(self):
+        condition = Field('ordinal').between(5, 14) & (Field('str_') == '1')
+        self.assertEqual(tuple(self.objs[10:15]), fetch_if(FetchClass, condition))
+
+    def testFetchIfQuery(self):
+        start = self.objs[0].obj_id
+        query = (Field('obj_id') >= start).order_by(Field('ordinal').desc()).limit(3, 1)
+        self.assertEqual(tuple(self.objs[26:29][::-1]), fetch_if(FetchClass, query))
+        self.assertRaises(ValueError, lambda: fetch_if(FetchClass, query, 1))
+
+    def testCountAndExists(self):
+        self.assertEqual(10, fetch_count(FetchClass, Field('str_') == '1'))
+        self.assertEqual(10, fetch_count(FetchClass, 'str_ = "2"'))
+        self.assertTrue(fetch_exists(FetchClass, Field('ordinal') == 29))
+        self.assertFalse(fetch_exists(FetchClass, Field('ordinal') == 30))
+        self.assertGreaterEqual(fetch_count(FetchClass), 30)
+
+    def testColumns(self):
+        rows = fetch_columns(FetchClass, ['ordinal', 'str_'], (Field('str_') == '0').limit(2))
+        self.assertEqual(((0, '0'), (1, '0')), rows)
+        named = fetch_columns(FetchClass, ['obj_id', 'ordinal'], Field('ordinal') == 5, named=True)
+        self.assertEqual((self.objs[5].obj_id, 5), (named[0].obj_id, named[0].ordinal))
+        self.assertRaises(ValueError, lambda: fetch_columns(FetchClass, ['missing']))
+
+    def testColumnsConverted(self):
+        obj = TestClass(7, b'bytes', 0.1, 'columns', False)
+        obj.create_entry()
+        self.assertEqual(((b'bytes', False), ), fetch_columns(TestClass, ['byte_value', 'bool_value'],
+                                                               Field('obj_id') == obj.obj_id))
+        obj.remove_entry()
+
+    def testAggregate(self):
+        condition = Field('obj_id') >= self.objs[0].obj_id
+        rows = aggregate(FetchClass, group_by='str_', where=condition, count=True, sum='ordinal', max='ordinal')
+        self.assertEqual([('0', 10, 45, 9), ('1', 10, 145, 19), ('2', 10, 245, 29)], [tuple(row) for row in rows])
+        self.assertEqual(245, rows[2].sum_ordinal)
+        total, = aggregate(FetchClass, where=condition, avg='ordinal', min=['ordinal', 'str_'])
+        self.assertEqual((14.5, 0, '0'), (total.avg_ordinal, total.min_ordinal, total.min_str_))
+        self.assertRaises(ValueError, lambda: aggregate(FetchClass, group_by='str_'))
+        self.assertRaises(ValueError, lambda: aggregate(FetchClass, sum='missing'))
+
+    def testIterAndSeekCondition(self):
+        condition = Field('str_') == '2'
+        self.assertEqual(tuple(self.objs[20:]), tuple(iter_if(FetchClass, condition)))
+        page, _ = seek_if(FetchClass, condition, None, 5)
+        self.assertEqual(tuple(self.objs[20:25]), page)
+
+    def tearDown(self) -> None:
+        [obj.remove_entry() for obj in self.objs]
+
+
+class DatabaseIterCalls(unittest.TestCase):
+    def setUp(self) -> None:
+        self.objs = [FetchClass(i, f'{floor(i/10)}') for i in range(30)]
+        [obj.create_entry() for obj in self.objs]
+
+    def testIterAll(self):
+        self.assertEqual(tuple(self.objs), tuple(iter_all(FetchClass, batch_size=7)))
+
+    def testIterIf(self):
+        self.assertEqual(tuple(self.objs[10:20]), tuple(iter_if(FetchClass, 'str_ = "1"', 3)))
+
+    def testIterWhere(self):
+        self.assertEqual(tuple(self.objs[20:]), tuple(iter_where(FetchClass, 'str_', '2', 4)))
+
+    def testWriteWhileIterating(self):
+        for obj in iter_where(FetchClass, 'str_', '0', 4):
+            obj.ordinal += 100
+            obj.update_entry()
+        with connect('test.db') as db:
+            cur = db.cursor()
+            cur.execute('SELECT count(*) FROM fetchclass WHERE ordinal >= 100')
+            self.assertEqual(10, cur.fetchone()[0])
+
     def tearDown(self) -> None:
         [obj.remove_entry() for obj in self.objs]
 
@@ -173,6 +403,68 @@ class DatabaseMigration(unittest.TestCase):
         _drop_table('test.db', 'migrate1')
 
 
+class DatabaseInPlaceMigration(unittest.TestCase):
+    def setUp(self) -> None:
+        self.class_ = datalite(db_path='test.db')(make_dataclass('Migrate3', [('ordinal', int), ('conventional', str)]))
+        self.objs = [self.class_(i, str(i)) for i in range(10)]
+        create_many(self.objs)
+        self.objs[-1].remove_entry()
+
+    def getColumns(self):
+        with connect('test.db') as db:
+            return [column[1] for column in db.execute('PRAGMA table_info(migrate3)').fetchall()]
+
+    def testAlterMigrate(self):
+        class_ = datalite(db_path='test.db')(make_dataclass(
+            'Migrate3', [('ordinal', int), ('renamed', str), ('added', float, field(default=0.5))]))
+        basic_migrate(class_, {'conventional': 'renamed'})
+        self.assertEqual(['obj_id', 'renamed', 'ordinal', 'added'], self.getColumns())  # Altered in place.
+        objs = fetch_all(class_)
+        self.assertEqual([obj.obj_id for obj in self.objs[:-1]], [obj.obj_id for obj in objs])
+        self.assertEqual([(i, str(i), 0.5) for i in range(9)], [(obj.ordinal, obj.renamed, obj.added) for obj in objs])
+
+    def testRebuildMigrate(self):
+        class_ = datalite(db_path='test.db')(make_dataclass('Migrate3', [('ordinal', str), ('cardinal', Unique[int])]))
+        basic_migrate(class_, {'conventional': 'cardinal'})
+        self.assertEqual(['obj_id', 'cardinal', 'ordinal'], self.getColumns())
+        objs = fetch_all(class_)
+        self.assertEqual([obj.obj_id for obj in self.objs[:-1]], [obj.obj_id for obj in objs])
+        self.assertEqual([(str(i), i) for i in range(9)], [(obj.ordinal, obj.cardinal) for obj in objs])
+        obj = class_('new', 10)
+        obj.create_entry()
+        self.assertEqual(self.objs[-1].obj_id + 1, obj.obj_id)
+
+    def testTransformMigrate(self):
+        basic_migrate(self.class_, {'ordinal': ('ordinal', lambda value: value * 2)})
+        objs = fetch_all(self.class_)
+        self.assertEqual([obj.obj_id for obj in self.objs[:-1]], [obj.obj_id for obj in objs])
+        self.assertEqual([i * 2 for i in range(9)], [obj.ordinal for obj in objs])
+
+    def testChunkedMigrateResume(self):
+        class_ = datalite(db_path='test.db')(make_dataclass('Migrate3', [('ordinal', int), ('renamed', str)]))
+        failing = [True]
+
+        def transform(value):
+            if failing[0] and value == '6':
+                raise ValueError(value)
+            return value + '!'
+        self.assertRaises(OperationalError, lambda: chunked_migrate(class_, {'conventional': ('renamed', transform)}, 3))
+        with connect('test.db') as db:
+            self.assertEqual([(6, )], db.execute('SELECT copied FROM datalite_migrations').fetchall())
+        failing[0] = False
+        progress = []
+        chunked_migrate(class_, {'conventional': ('renamed', transform)}, 3, progress.append)
+        self.assertEqual((9, 9), (progress[-1].copied, progress[-1].total))
+        objs = fetch_all(class_)
+        self.assertEqual([obj.obj_id for obj in self.objs[:-1]], [obj.obj_id for obj in objs])
+        self.assertEqual([f'{i}!' for i in range(9)], [obj.renamed for obj in objs])
+        with connect('test.db') as db:
+            self.assertEqual([], db.execute('SELECT * FROM datalite_migrations').fetchall())
+
+    def tearDown(self) -> None:
+        _drop_table('test.db', 'migrate3')
+
+
 def helperFunc():
     obj = ConstraintedClass("This string is supposed to be unique.")
     obj.create_entry()
@@ -219,5 +511,592 @@ class DatabaseMassInsert(unittest.TestCase):
         [obj.remove_entry() for obj in self.objs]
 
 
+class DatabasePragmas(unittest.TestCase):
+    def testProfileApplied(self):
+        @datalite(db_path='pragma.db', pragmas='balanced')
+        @dataclass
+        class PragmaClass:
+            value: int
+        with _connect('pragma.db') as con:
+            self.assertEqual('wal', con.execute('PRAGMA journal_mode').fetchone()[0])
+            self.assertEqual(1, con.execute('PRAGMA synchronous').fetchone()[0])
+            self.assertEqual(5000, con.execute('PRAGMA busy_timeout').fetchone()[0])
+
+    def testCustomPragmas(self):
+        register_pool('pragma.db', pragmas={'cache_size': -1024, 'temp_store': 'MEMORY'})
+        with _connect('pragma.db') as con:
+            self.assertEqual(-1024, con.execute('PRAGMA cache_size').fetchone()[0])
+            self.assertEqual(2, con.execute('PRAGMA temp_store').fetchone()[0])
+
+    def testInvalidPragmas(self):
+        self.assertRaises(ValueError, lambda: register_pool('pragma.db', pragmas='unknown'))
+        self.assertRaises(ValueError, lambda: register_pool('pragma.db', pragmas={'cache_size': '1; DROP'}))
+
+
+class DatabaseTableInfo(unittest.TestCase):
+    def testColumnOrder(self):
+        self.assertEqual(TestClass._table_info.columns,
+                         ('bool_value', 'byte_value', 'float_value', 'integer_value', 'str_value'))
+
+    def testStatementCache(self):
+        self.assertIs(FetchClass._table_info.select_equals_sql('str_'),
+                      FetchClass._table_info.select_equals_sql('str_'))
+
+    def testConvertersRoundTrip(self):
+        obj = TestClass(3, b'blob', 0.5, 'text', False)
+        obj.create_entry()
+        t_obj = fetch_from(TestClass, obj.obj_id)
+        self.assertEqual(obj, t_obj)
+        self.assertIs(t_obj.bool_value, False)
+        self.assertIsInstance(t_obj.byte_value, bytes)
+        obj.remove_entry()
+
+    def testFetchWhereQuoted(self):
+        obj = FetchClass(1, 'a "quoted" value')
+        obj.create_entry()
+        self.assertEqual((obj, ), fetch_where(FetchClass, 'str_', 'a "quoted" value'))
+        obj.remove_entry()
+
+
+class DatabaseConnectionPool(unittest.TestCase):
+    def testSameThreadReuse(self):
+        with _connect('test.db') as first:
+            pass
+        with _connect('test.db') as second:
+            self.assertIs(first, second)
+
+    def testNestedShareConnection(self):
+        with _connect('test.db') as outer:
+            with _connect('test.db') as inner:
+                self.assertIs(outer, inner)
+
+    def testThreadsGetOwnConnections(self):
+        connections = []
+
+        def borrow():
+            with _connect('test.db') as con:
+                connections.append(con)
+        with _connect('test.db') as con:
+            thread = Thread(target=borrow)
+            thread.start()
+            thread.join()
+            self.assertIsNot(con, connections[0])
+
+    def testPerCallConnections(self):
+        self.assertEqual(get_pool(':memory:').size, 0)
+        with _connect(':memory:') as first:
+            pass
+        with _connect(':memory:') as second:
+            self.assertIsNot(first, second)
+
+    def testCloseAllWhileBorrowed(self):
+        with _connect('test.db') as outer:
+            close_all('test.db')
+            with _connect('test.db') as inner:
+                self.assertIs(outer, inner)
+            outer.execute("INSERT INTO fetchclass (ordinal, str_) VALUES (1, 'borrowed')")
+        obj = FetchClass(2, 'borrowed')
+        obj.create_entry()
+        with connect('test.db') as db:
+            self.assertEqual(2, db.execute("SELECT count(*) FROM fetchclass WHERE str_ = 'borrowed'").fetchone()[0])
+            db.execute("DELETE FROM fetchclass WHERE str_ = 'borrowed'")
+
+    def testCloseAllFromAnotherThread(self):
+        with _connect('test.db') as con:
+            thread = Thread(target=close_all, args=('test.db', ))
+            thread.start()
+            thread.join()
+            self.assertEqual(1, con.execute('SELECT 1').fetchone()[0])
+
+    def testUnpooledClass(self):
+        obj = UnpooledClass(1)
+        obj.create_entry()
+        self.assertTrue(is_fetchable(UnpooledClass, obj.obj_id))
+        self.assertEqual(0, get_pool('unpooled.db').size)
+        obj.remove_entry()
+
+    def testConflictingPoolSize(self):
+        with self.assertWarns(RuntimeWarning):
+            datalite('unpooled.db')(make_dataclass('PooledClass', [('number', int)]))
+        self.assertEqual(0, get_pool('unpooled.db').size)
+
+    def testCloseAll(self):
+        with _connect('test.db') as first:
+            pass
+        close_all('test.db')
+        with _connect('test.db') as second:
+            self.assertIsNot(first, second)
+
+
+class DatabaseBulkInsert(unittest.TestCase):
+    def testMassCreateIds(self):
+        existing = MassCommit('existing')
+        existing.create_entry()
+        objs = [MassCommit(f'"quoted" \'{i}\'') for i in range(25)]
+        _mass_insert(objs, 'test.db', chunk_size=10)
+        self.assertEqual(tuple(objs), fetch_many_ids(MassCommit, [obj.obj_id for obj in objs]))
+        self.assertEqual(len(set(obj.obj_id for obj in objs)), 25)
+        [obj.remove_entry() for obj in objs + [existing]]
+
+    def testMassCreateReservedIds(self):
+        parents = [MassCommit(f'parent {i}') for i in range(5)]
+        create_many(parents)
+        parents[-1].remove_entry()
+        children = [MassCommit(f'child of {parent.obj_id}') for parent in parents]
+        create_many(children)
+        self.assertEqual(list(range(parents[-1].obj_id + 1, parents[-1].obj_id + 6)),
+                         [child.obj_id for child in children])
+        last = MassCommit('last')
+        last.create_entry()
+        self.assertEqual(children[-1].obj_id + 1, last.obj_id)
+        delete_where(MassCommit, Field('str_').like('parent%') | Field('str_').like('child%') | (Field('str_') == 'last'))
+
+    def testCopyManyNewTable(self):
+        with connect('other.db') as db:
+            db.execute('DROP TABLE IF EXISTS masscommit')
+        objs = [MassCommit(f'copied {i}') for i in range(3)]
+        create_many(objs)
+        ids = [obj.obj_id for obj in objs]
+        objs[0].str_ = 'modified'
+        copy_many(objs, 'other.db')
+        self.assertEqual(ids, [obj.obj_id for obj in objs])
+        with connect('other.db') as db:
+            self.assertEqual([(1, 'modified'), (2, 'copied 1'), (3, 'copied 2')],
+                             db.execute('SELECT obj_id, str_ FROM masscommit').fetchall())
+        objs[0].update_entry()
+        self.assertEqual('modified', fetch_from(MassCommit, ids[0]).str_)
+        remove_many(MassCommit, ids)
+        _drop_table('other.db', 'masscommit')
+
+    def testMassCreateBytes(self):
+        objs = [BytesClass(bytes([i, 0, 255])) for i in range(5)]
+        create_many(objs)
+        self.assertEqual(tuple(objs), fetch_many_ids(BytesClass, [obj.obj_id for obj in objs]))
+        [obj.remove_entry() for obj in objs]
+
+    def testCreateManyGenerator(self):
+        committed = []
+
+        def generate():
+            for i in range(25):
+                if i == 20:
+                    with connect('test.db') as db:
+                        committed.append(db.execute('SELECT count(*) FROM masscommit WHERE str_ LIKE "gen%"')
+                                         .fetchone()[0])
+                yield MassCommit(f'gen {i}')
+        create_many(generate(), commit_every=10)
+        objs = fetch_where(MassCommit, 'str_', 'gen 24')
+        self.assertEqual([20], committed)
+        self.assertEqual(1, len(objs))
+        [remove_from(MassCommit, obj.obj_id) for obj in fetch_if(MassCommit, 'str_ LIKE "gen%"')]
+
+    def testCreateManyEmpty(self):
+        self.assertRaises(ValueError, lambda: create_many(iter(())))
+
+
+class DatabaseBulkModify(unittest.TestCase):
+    def setUp(self) -> None:
+        self.objs = [FetchClass(i, 'bulk') for i in range(20)]
+        create_many(self.objs)
+
+    def testUpdateMany(self):
+        for obj in self.objs[:10]:
+            obj.ordinal += 100
+        self.objs[15].str_ = 'other'
+        update_many(self.objs)
+        self.assertEqual(tuple(self.objs), fetch_many_ids(FetchClass, [obj.obj_id for obj in self.objs]))
+
+    def testUpdateManyFields(self):
+        for obj in self.objs:
+            obj.ordinal, obj.str_ = -1, 'ignored'
+        update_many(self.objs, fields=['ordinal'])
+        self.assertEqual(20, fetch_count(FetchClass, (Field('ordinal') == -1) & (Field('str_') == 'bulk')))
+        self.assertEqual(('str_', ), FetchClass._table_info.dirty_columns(self.objs[0]))
+        [setattr(obj, 'str_', 'bulk') for obj in self.objs]
+        self.assertRaises(ValueError, lambda: update_many(self.objs, fields=[]))
+
+    def testRemoveMany(self):
+        remove_many(FetchClass, [obj.obj_id for obj in self.objs[:15]])
+        self.assertEqual(tuple(self.objs[15:]), fetch_where(FetchClass, 'str_', 'bulk'))
+        self.objs = self.objs[15:]
+
+    def testWhere(self):
+        self.assertEqual(5, update_where(FetchClass, {'str_': 'bulk updated'}, Field('ordinal') < 5))
+        self.assertEqual(5, delete_where(FetchClass, Field('str_') == 'bulk updated'))
+        self.assertEqual(tuple(self.objs[5:]), fetch_where(FetchClass, 'str_', 'bulk'))
+        self.assertRaises(ValueError, lambda: update_where(FetchClass, {'missing': 1}, 'ordinal > 0'))
+        self.assertRaises(ValueError, lambda: update_where(FetchClass, {'ordinal': 1}, None))
+        self.assertRaises(ValueError, lambda: delete_where(FetchClass, None))
+        self.objs = self.objs[5:]
+
+    def tearDown(self) -> None:
+        remove_many(FetchClass, [obj.obj_id for obj in self.objs])
+
+
+class DatabaseSession(unittest.TestCase):
+    def setUp(self) -> None:
+        self.objs = [FetchClass(i, 'session') for i in range(5)]
+
+    def testFlushOnExit(self):
+        with Session() as session:
+            [session.add(obj) for obj in self.objs]
+        self.assertEqual(tuple(self.objs), fetch_where(FetchClass, 'str_', 'session'))
+        with Session() as session:
+            self.objs[0].ordinal = 100
+            session.update(self.objs[0])
+            session.remove(self.objs[1])
+        self.assertEqual(tuple(self.objs[:1] + self.objs[2:]), fetch_where(FetchClass, 'str_', 'session'))
+        self.assertEqual(100, fetch_from(FetchClass, self.objs[0].obj_id).ordinal)
+        self.objs.pop(1)
+
+    def testDiscardOnError(self):
+        def fail():
+            with Session() as session:
+                [session.add(obj) for obj in self.objs]
+                raise RuntimeError
+        self.assertRaises(RuntimeError, fail)
+        self.assertEqual((), fetch_where(FetchClass, 'str_', 'session'))
+        self.objs = []
+
+    def testRestoreOnFailedFlush(self):
+        existing = [ConstraintedClass('session a'), ConstraintedClass('session b')]
+        create_many(existing)
+        new = ConstraintedClass('session new')
+        existing[1].unique_str = 'session a'
+
+        def flush():
+            with Session() as session:
+                session.add(new)
+                session.update(existing[1])
+        self.assertRaises(ConstraintFailedError, flush)
+        self.assertFalse(hasattr(new, 'obj_id'))
+        self.assertEqual(('unique_str', ), ConstraintedClass._table_info.dirty_columns(existing[1]))
+        other = ConstraintedClass('session other')
+        other.create_entry()
+        new.create_entry()
+        self.assertNotEqual(other.obj_id, new.obj_id)
+        remove_many(ConstraintedClass, [obj.obj_id for obj in existing + [new, other]])
+        self.objs = []
+
+    def testAddThenRemove(self):
+        with Session() as session:
+            session.add(self.objs[0])
+            session.remove(self.objs[0])
+        self.assertEqual((), fetch_where(FetchClass, 'str_', 'session'))
+        self.objs = []
+
+    def tearDown(self) -> None:
+        [obj.remove_entry() for obj in self.objs]
+
+
+class DatabaseObjectCache(unittest.TestCase):
+    def setUp(self) -> None:
+        clear_cache(CachedClass)
+        self.objs = [CachedClass(f'cached {i}') for i in range(3)]
+        [obj.create_entry() for obj in self.objs]
+
+    def testHitAndEviction(self):
+        start = cache_info(CachedClass)
+        self.assertIs(self.objs[2], fetch_from(CachedClass, self.objs[2].obj_id))
+        fetched = fetch_from(CachedClass, self.objs[0].obj_id)
+        self.assertIsNot(self.objs[0], fetched)
+        self.assertIs(fetched, fetch_from(CachedClass, self.objs[0].obj_id))
+        info = cache_info(CachedClass)
+        self.assertEqual((2, 1, 2), (info.hits - start.hits, info.misses - start.misses, info.current_size))
+
+    def testCoherence(self):
+        clear_cache(CachedClass)
+        fetched = fetch_from(CachedClass, self.objs[1].obj_id)
+        self.assertIsNot(self.objs[1], fetched)
+        self.objs[1].str_ = 'updated'
+        self.objs[1].update_entry()
+        refetched = fetch_from(CachedClass, fetched.obj_id)
+        self.assertIsNot(fetched, refetched)
+        self.assertEqual('updated', refetched.str_)
+        remove_from(CachedClass, self.objs[1].obj_id)
+        self.assertRaises(KeyError, lambda: fetch_from(CachedClass, self.objs[1].obj_id))
+        self.objs.pop(1)
+
+    def testIdentity(self):
+        cached = fetch_from(CachedClass, self.objs[0].obj_id)
+        self.assertIs(cached, fetch_equals(CachedClass, 'str_', 'cached 0'))
+        self.assertIs(cached, fetch_from(CachedClass, self.objs[0].obj_id))
+
+    def testExpiry(self):
+        cache = ObjectCache(10, ttl=-1)
+        cache.put(self.objs[0])
+        self.assertIsNone(cache.get(self.objs[0].obj_id))
+        self.assertEqual((0, 1, 10, 0), cache.info())
+
+    def tearDown(self) -> None:
+        [obj.remove_entry() for obj in self.objs]
+
+
+def getIndexes(table_name, db_path='test.db'):
+    with connect(db_path) as db:
+        cur = db.cursor()
+        cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table_name, ))
+        return dict(cur.fetchall())
+
+
+class DatabaseIndexes(unittest.TestCase):
+    def testIndexesCreated(self):
+        indexes = getIndexes('indexedclass')
+        self.assertEqual({'idx_indexedclass_email', 'idx_indexedclass_first_second', 'positive_second'},
+                         set(indexes))
+        self.assertIn('WHERE second > 0', indexes['positive_second'])
+
+    def testIndexUsed(self):
+        with connect('test.db') as db:
+            plan = db.execute('EXPLAIN QUERY PLAN ' + IndexedClass._table_info.select_equals_sql('email'),
+                              ('a@b.c', )).fetchall()
+        self.assertIn('idx_indexedclass_email', str(plan))
+
+    def testIndexedField(self):
+        obj = IndexedClass('a@b.c', 1, 2)
+        obj.create_entry()
+        self.assertEqual((obj, ), fetch_where(IndexedClass, 'email', 'a@b.c'))
+        self.assertRaises(ConstraintFailedError, lambda: IndexedClass('d@e.f', 3, 2).create_entry())
+        obj.remove_entry()
+
+    def testMigrationRecreatesIndexes(self):
+        before = getIndexes('indexedclass')
+        basic_migrate(IndexedClass)
+        self.assertEqual(before, getIndexes('indexedclass'))
+
+    def testUnknownColumn(self):
+        self.assertRaises(ValueError, lambda: datalite('test.db', indexes=[Index('missing')])(FetchClass))
+
+    def testAddIndexedField(self):
+        with connect('index.db') as db:
+            db.execute('DROP TABLE IF EXISTS user')
+        datalite('index.db')(make_dataclass('User', [('name', str)]))
+        user_class = datalite('index.db')(make_dataclass('User', [('name', str), ('email', Indexed[str])]))
+        self.assertNotIn('idx_user_email', getIndexes('user', 'index.db'))
+        basic_migrate(user_class)
+        self.assertIn('idx_user_email', getIndexes('user', 'index.db'))
+
+    def testDropUndeclaredIndexes(self):
+        with connect('index.db') as db:
+            db.execute('DROP TABLE IF EXISTS user')
+        datalite('index.db')(make_dataclass('User', [('name', Indexed[str]), ('email', Indexed[str])]))
+        user_class = datalite('index.db')(make_dataclass('User', [('username', Indexed[str]), ('email', str)]))
+        basic_migrate(user_class, {'name': 'username'})
+        self.assertEqual(['idx_user_username'], list(getIndexes('user', 'index.db')))
+
+class DatabaseUpsert(unittest.TestCase):
+    def setUp(self) -> None:
+        self.existing = UpsertClass('existing', 1)
+        self.existing.create_entry()
+
+    def testCreateIgnore(self):
+        obj = UpsertClass('existing', 2)
+        obj.create_entry(on_conflict='ignore')
+        self.assertIsNone(obj.obj_id)
+        self.assertEqual(1, fetch_from(UpsertClass, self.existing.obj_id).value)
+
+    def testCreateUpdate(self):
+        obj = UpsertClass('existing', 2)
+        obj.create_entry(on_conflict='update')
+        self.assertEqual(self.existing.obj_id, obj.obj_id)
+        self.assertEqual(2, fetch_from(UpsertClass, self.existing.obj_id).value)
+        self.assertEqual(1, fetch_count(UpsertClass))
+
+    def testCreateReplace(self):
+        obj = UpsertClass('existing', 2)
+        obj.create_entry(on_conflict='replace')
+        self.assertNotEqual(self.existing.obj_id, obj.obj_id)
+        self.assertFalse(fetch_exists(UpsertClass, Field('obj_id') == self.existing.obj_id))
+        self.assertEqual(obj, fetch_from(UpsertClass, obj.obj_id))
+
+    def testCreateManyUpsert(self):
+        objs = [UpsertClass('existing', 3), UpsertClass('new', 4)]
+        create_many(objs, on_conflict='ignore')
+        self.assertEqual([None, fetch_equals(UpsertClass, 'key', 'new').obj_id], [obj.obj_id for obj in objs])
+        objs = [UpsertClass('new', 5), UpsertClass('existing', 6), UpsertClass('newer', 7)]
+        create_many(objs, on_conflict='update')
+        self.assertEqual(self.existing.obj_id, objs[1].obj_id)
+        self.assertEqual(tuple(objs), fetch_many_ids(UpsertClass, [obj.obj_id for obj in objs]))
+        self.assertEqual(3, fetch_count(UpsertClass))
+
+    def testUnknownMode(self):
+        self.assertRaises(ValueError, lambda: UpsertClass('other').create_entry(on_conflict='merge'))
+
+    def tearDown(self) -> None:
+        delete_where(UpsertClass, '1')
+
+
+class DatabaseAsync(unittest.TestCase):
+    def testCreateAndFetch(self):
+        async def run():
+            obj = FetchClass(1, 'async')
+            await obj.acreate_entry()
+            self.assertEqual(obj, await afetch_from(FetchClass, obj.obj_id))
+            obj.ordinal = 2
+            await obj.aupdate_entry()
+            self.assertEqual((obj, ), await afetch_where(FetchClass, 'str_', 'async'))
+            await obj.aremove_entry()
+            self.assertEqual((), await afetch_where(FetchClass, 'str_', 'async'))
+        asyncio.run(run())
+
+    def testCoalescedWrites(self):
+        async def run():
+            objs = [FetchClass(i, 'coalesced') for i in range(50)]
+            await asyncio.gather(*(obj.acreate_entry() for obj in objs))
+            self.assertEqual(50, len({obj.obj_id for obj in objs}))
+            self.assertEqual(50, await afetch_count(FetchClass, Field('str_') == 'coalesced'))
+            await aremove_many(FetchClass, [obj.obj_id for obj in objs])
+        asyncio.run(run())
+
+    def testFailedWriteIsolated(self):
+        async def run():
+            objs = [ConstraintedClass('async unique'), ConstraintedClass('async unique'),
+                    ConstraintedClass('async other')]
+            results = await asyncio.gather(*(obj.acreate_entry() for obj in objs), return_exceptions=True)
+            self.assertEqual(1, sum(isinstance(result, ConstraintFailedError) for result in results))
+            self.assertEqual(2, len(await afetch_all(ConstraintedClass)))
+            await aremove_many(ConstraintedClass, [obj.obj_id for obj, result in zip(objs, results)
+                                                   if result is None])
+        asyncio.run(run())
+
+    def testFailedTransaction(self):
+        directory = mkdtemp()
+        unreachable = datalite(f'{directory}/unreachable.db')(make_dataclass('Unreachable', [('number', int)]))
+        close_all(unreachable.db_path)
+        rmtree(directory)
+
+        async def run():
+            with self.assertRaises(OperationalError):
+                await asyncio.wait_for(unreachable(1).acreate_entry(), 5)
+        asyncio.run(run())
+
+    def testRestoreOnFailedWrite(self):
+        obj = FetchClass(1, 'rolled back')
+
+        def create_and_fail():
+            obj.create_entry()
+            raise ValueError()
+        future = _get_executor('test.db').write(create_and_fail, synced_objects=(obj, ))
+        self.assertRaises(ValueError, lambda: future.result(5))
+        self.assertFalse(hasattr(obj, 'obj_id'))
+        self.assertEqual(0, fetch_count(FetchClass, Field('str_') == 'rolled back'))
+
+    def testWriterSurvivesBaseException(self):
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt():
+            raise Interrupt()
+        executor = _get_executor('test.db')
+        self.assertRaises(Interrupt, lambda: executor.write(interrupt).result(5))
+        self.assertEqual(1, executor.write(lambda: 1).result(5))
+
+    def testAsyncIteration(self):
+        async def run():
+            objs = [FetchClass(i, 'async iter') for i in range(25)]
+            await acreate_many(objs)
+            self.assertEqual(objs, [obj async for obj in aiter_where(FetchClass, 'str_', 'async iter', 10)])
+            await aremove_many(FetchClass, [obj.obj_id for obj in objs])
+        asyncio.run(run())
+
+    def tearDown(self) -> None:
+        close_executors()
+
+
+class DatabaseInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.events = []
+        add_hook(self.events.append)
+
+    def testEvents(self):
+        objs = [MassCommit(f'instrumented {i}') for i in range(5)]
+        create_many(objs)
+        fetch_if(MassCommit, Field('str_').like('instrumented%'))
+        insert = next(event for event in self.events if event.operation == 'INSERT' and event.class_ is MassCommit)
+        select = next(event for event in self.events if event.operation == 'SELECT' and 'LIKE' in event.sql)
+        self.assertEqual((MassCommit, 10, 5), (insert.class_, insert.parameter_count, insert.rows))
+        self.assertEqual((MassCommit, 1, 5), (select.class_, select.parameter_count, select.rows))
+        self.assertTrue(all(event.duration >= 0 for event in self.events))
+        remove_many(MassCommit, [obj.obj_id for obj in objs])
+
+    def testConnectionShortcuts(self):
+        with _connect('test.db') as con:
+            self.assertEqual(0, con.execute('SELECT count(*) FROM masscommit WHERE str_ = ?',
+                                            ('shortcut', )).fetchone()[0])
+        select = next(event for event in self.events if 'count(*)' in event.sql)
+        self.assertEqual((MassCommit, 'SELECT', 1), (select.class_, select.operation, select.parameter_count))
+
+    def testCollector(self):
+        collector = LatencyCollector()
+        add_hook(collector)
+        try:
+            fetch_all(MassCommit)
+            fetch_all(MassCommit)
+        finally:
+            remove_hook(collector)
+        stats = collector.stats()[('MassCommit', 'SELECT')]
+        self.assertEqual(2, stats.count)
+        self.assertEqual(2, sum(stats.buckets))
+        self.assertLessEqual(stats.minimum, stats.mean)
+        collector.reset()
+        self.assertEqual({}, collector.stats())
+
+    def testSlowQueryLog(self):
+        hook = SlowQueryLog(0)
+        add_hook(hook)
+        try:
+            with self.assertLogs('datalite', 'WARNING') as logs:
+                fetch_all(MassCommit)
+        finally:
+            remove_hook(hook)
+        self.assertIn('FROM masscommit', logs.output[0])
+
+    def testFailingHook(self):
+        def hook(event):
+            raise ValueError()
+        add_hook(hook)
+        try:
+            with self.assertWarns(RuntimeWarning):
+                fetch_all(MassCommit)
+        finally:
+            remove_hook(hook)
+
+    def tearDown(self) -> None:
+        remove_hook(self.events.append)
+
+
+class DatabaseHydration(unittest.TestCase):
+    def setUp(self) -> None:
+        self.objs = [HydratedClass(i, bytes([i])) for i in range(5)]
+        create_many(self.objs)
+
+    def testRawFetch(self):
+        HydratedClass.initialised = 0
+        fetched = fetch_all(HydratedClass, raw=True)
+        self.assertEqual(0, HydratedClass.initialised)
+        self.assertEqual([(obj.obj_id, obj.number, obj.blob) for obj in self.objs],
+                         [(obj.obj_id, obj.number, obj.blob) for obj in fetched])
+        fetched[0].number = 10
+        self.assertEqual(('number', ), HydratedClass._table_info.dirty_columns(fetched[0]))
+
+    def testInitFetch(self):
+        HydratedClass.initialised = 0
+        fetched = tuple(iter_all(HydratedClass))
+        self.assertEqual(len(self.objs), HydratedClass.initialised)
+        self.assertEqual([obj.obj_id for obj in self.objs], [obj.obj_id for obj in fetched])
+        self.assertEqual((), HydratedClass._table_info.dirty_columns(fetched[0]))
+
+    def testRawSlotted(self):
+        obj = SlottedClass(3)
+        obj.create_entry()
+        fetched = fetch_range(SlottedClass, range(obj.obj_id, obj.obj_id + 1), raw=True)[0]
+        self.assertEqual((obj.obj_id, 3), (fetched.obj_id, fetched.number))
+        obj.remove_entry()
+
+    def tearDown(self) -> None:
+        remove_many(HydratedClass, [obj.obj_id for obj in self.objs])
+
+
 if __name__ == '__main__':
     unittest.main()